@@ -1,8 +1,9 @@
 """Модуль обработки запросов через GigaChat API."""
 
 from .gigachat_client import GigaChatClient
+from .async_gigachat_client import AsyncGigaChatClient
 from .response_generator import ResponseGenerator
 from .config import GigaChatConfig
 
-__all__ = ["GigaChatClient", "ResponseGenerator", "GigaChatConfig"]
+__all__ = ["GigaChatClient", "AsyncGigaChatClient", "ResponseGenerator", "GigaChatConfig"]
 
@@ -0,0 +1,422 @@
+"""
+Асинхронный клиент для работы с GigaChat API.
+Позволяет обрабатывать запросы нескольких пользователей в одном event loop.
+"""
+
+import asyncio
+import logging
+import time
+import weakref
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+import orjson
+
+from ai_processor.base_client import AsyncBaseLLMClient
+from utils.response_cache import ResponseCache
+
+from .base_client import (
+    MAX_RETRIES,
+    RETRY_BACKOFF,
+    RETRY_STATUSES,
+    TOKEN_REFRESH_MARGIN,
+    GigaChatBase,
+    _elapsed_ms,
+)
+from .config import GigaChatConfig
+
+logger = logging.getLogger(__name__)
+
+
+async def _aiter_lines(response: httpx.Response) -> AsyncIterator[bytes]:
+    """
+    Разбивает тело потокового ответа на строки без декодирования в str.
+    
+    Args:
+        response: Потоковый ответ httpx
+    
+    Yields:
+        Строки потока в bytes без перевода строки
+    """
+    tail = b""
+    async for chunk in response.aiter_bytes():
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line[:-1] if line.endswith(b"\r") else line
+    if tail:
+        yield tail[:-1] if tail.endswith(b"\r") else tail
+
+
+def _refresh_token_later(client_ref: "weakref.ref"):
+    """
+    Запускает фоновое обновление токена клиента по таймеру event loop.
+    
+    Таймер держит только слабую ссылку: клиент, который больше
+    не используется, удаляется сборщиком мусора, и обновление не выполняется.
+    
+    Args:
+        client_ref: Слабая ссылка на AsyncGigaChatClient
+    """
+    client = client_ref()
+    if client is not None and not client._closed:
+        client._refresh_task = asyncio.get_running_loop().create_task(
+            client._refresh_token_in_background()
+        )
+
+
+class AsyncGigaChatClient(GigaChatBase, AsyncBaseLLMClient):
+    """Асинхронный клиент для GigaChat API на основе httpx."""
+    
+    def __init__(
+        self,
+        authorization_key: str = None,
+        model: str = "GigaChat",
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        scope: str = "GIGACHAT_API_PERS",
+        config: GigaChatConfig = None,
+        cache: Optional[ResponseCache] = None
+    ):
+        """
+        Инициализирует асинхронный GigaChat клиент.
+        
+        Args:
+            authorization_key: Authorization key в формате Basic <key>
+            model: Модель для использования (GigaChat, GigaChat-Pro, GigaChat-Plus)
+            temperature: Температура генерации (0.0 - 2.0)
+            max_tokens: Максимальное количество токенов
+            scope: Область доступа API
+            config: Объект конфигурации (опционально, переопределяет другие параметры)
+            cache: Кеш ответов (опционально)
+        """
+        super().__init__(
+            authorization_key, model, temperature, max_tokens, scope, config, cache
+        )
+        
+        # Фоновое обновление токена до истечения, как в синхронном клиенте.
+        # Блокировка гарантирует, что параллельные запросы обновляют
+        # токен только один раз
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_handle: Optional[asyncio.TimerHandle] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        
+        # Один клиент на все запросы: HTTP/2 мультиплексирует
+        # параллельные запросы к одному хосту в одном соединении.
+        # Транспорт повторяет только ошибки соединения; ответы 429/5xx
+        # повторяются в _send с учетом Retry-After
+        self._client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                verify=self.verify_ssl,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+                retries=MAX_RETRIES
+            ),
+            timeout=self.timeout,
+            headers={'Accept': 'application/json'}
+        )
+        
+        logger.info(f"Асинхронный GigaChat клиент инициализирован: модель={self.model}")
+    
+    async def aclose(self):
+        """Закрывает HTTP-клиент и освобождает соединения."""
+        self._closed = True
+        self._cancel_token_refresh()
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        await self._client.aclose()
+        logger.info("Асинхронный GigaChat клиент закрыт")
+    
+    def __del__(self):
+        # Клиент без aclose(): таймер обновления токена не должен пережить его
+        if getattr(self, "_refresh_handle", None) is not None:
+            self._refresh_handle.cancel()
+    
+    async def __aenter__(self) -> "AsyncGigaChatClient":
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+    
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        stream: bool = False,
+        **kwargs
+    ) -> httpx.Response:
+        """
+        Отправляет запрос, повторяя ответы 429/5xx.
+        
+        Повторяются только ответы, означающие, что сервер запрос не выполнил;
+        ошибки и таймауты чтения не повторяются: chat/completions
+        не идемпотентен. Задержка берется из Retry-After, иначе растет
+        экспоненциально.
+        
+        Args:
+            method: HTTP-метод
+            url: Адрес запроса
+            stream: Вернуть ответ без чтения тела (закрывает вызывающий)
+            **kwargs: Параметры httpx.AsyncClient.build_request
+        
+        Returns:
+            Ответ сервера
+        """
+        request = self._client.build_request(method, url, **kwargs)
+        
+        for attempt in range(MAX_RETRIES + 1):
+            response = await self._client.send(request, stream=True)
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                break
+            
+            await response.aclose()
+            delay = self._retry_delay(response, attempt)
+            logger.warning(
+                f"GigaChat ответил {response.status_code}, повтор через {delay:.1f} с"
+            )
+            await asyncio.sleep(delay)
+        
+        if not stream:
+            # Чтение тела до конца возвращает соединение в пул
+            await response.aread()
+        return response
+    
+    @staticmethod
+    def _retry_delay(response: httpx.Response, attempt: int) -> float:
+        """
+        Вычисляет задержку перед повтором запроса.
+        
+        Args:
+            response: Ответ, который будет повторен
+            attempt: Номер попытки, начиная с 0
+        
+        Returns:
+            Задержка в секундах
+        """
+        backoff = RETRY_BACKOFF * (2 ** attempt)
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return max(float(retry_after), 0)
+            except ValueError:
+                # HTTP-дата вместо секунд: используем обычную задержку
+                pass
+        return backoff
+    
+    async def _get_access_token(self, force: bool = False) -> str:
+        """
+        Получает access token для авторизации запросов.
+        Кеширует токен и обновляет его при необходимости.
+        
+        Args:
+            force: Обновить токен, даже если текущий еще действителен
+        
+        Returns:
+            Access token
+        """
+        if not force and self._token_is_valid():
+            return self._access_token
+        
+        async with self._refresh_lock:
+            # Пока ждали блокировку, токен мог обновить другой запрос
+            if not force and self._token_is_valid():
+                return self._access_token
+            
+            # Токен мог получить другой экземпляр клиента с тем же ключом
+            token = self._adopt_cached_token(self._access_token if force else None)
+            if token:
+                return token
+            
+            return await self._request_access_token()
+    
+    async def _request_access_token(self) -> str:
+        """
+        Получает новый токен через OAuth и сохраняет его в общем кеше.
+        
+        Returns:
+            Access token
+        """
+        try:
+            started = time.perf_counter()
+            response = await self._send(
+                'POST',
+                self.oauth_url,
+                headers=self._oauth_request_headers(),
+                data=self._oauth_payload
+            )
+            response.raise_for_status()
+            
+            token = self._store_token(orjson.loads(response.content))
+            
+            logger.info(f"Access token успешно получен: oauth_ms={_elapsed_ms(started):.1f}")
+            return token
+        
+        except Exception as e:
+            logger.error(f"Ошибка получения access token: {e}")
+            raise
+    
+    def _on_token_changed(self, token: str, expires_at: float):
+        """
+        Сохраняет токен в заголовках клиента и планирует его обновление.
+        
+        Args:
+            token: Access token
+            expires_at: Время истечения (Unix-время)
+        """
+        self._client.headers['Authorization'] = f'Bearer {token}'
+        self._schedule_token_refresh(expires_at - time.time())
+    
+    def _schedule_token_refresh(self, expires_in: float):
+        """
+        Планирует фоновое обновление токена за 2 минуты до истечения.
+        
+        Args:
+            expires_in: Время жизни токена в секундах
+        """
+        self._cancel_token_refresh()
+        
+        # Слишком короткоживущий токен обновится при запросе
+        if expires_in <= TOKEN_REFRESH_MARGIN or self._closed:
+            return
+        
+        self._refresh_handle = asyncio.get_running_loop().call_later(
+            expires_in - TOKEN_REFRESH_MARGIN,
+            _refresh_token_later,
+            weakref.ref(self)
+        )
+    
+    def _cancel_token_refresh(self):
+        """Отменяет запланированное фоновое обновление токена."""
+        if self._refresh_handle:
+            self._refresh_handle.cancel()
+            self._refresh_handle = None
+    
+    async def _refresh_token_in_background(self):
+        """Обновляет токен вне пути обработки запросов."""
+        try:
+            await self._get_access_token(force=True)
+        except Exception as e:
+            # Токен будет получен при следующем запросе
+            logger.warning(f"Фоновое обновление токена не удалось: {e}")
+    
+    async def _acomplete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> str:
+        """
+        Выполняет запрос к chat/completions.
+        
+        Args:
+            messages: Список сообщений для GigaChat
+            temperature: Температура
+            max_tokens: Макс токены
+        
+        Returns:
+            Текст ответа
+        """
+        started = time.perf_counter()
+        
+        # Authorization: Bearer хранится в заголовках клиента
+        await self._get_access_token()
+        token_ms = _elapsed_ms(started)
+        
+        mark = time.perf_counter()
+        payload = self._build_payload(messages, temperature, max_tokens)
+        body = self._encoder.encode(payload)
+        encode_ms = _elapsed_ms(mark)
+        
+        mark = time.perf_counter()
+        response = await self._send(
+            'POST',
+            f"{self.api_base_url}/chat/completions",
+            headers=self._json_headers,
+            content=body
+        )
+        response.raise_for_status()
+        post_ms = _elapsed_ms(mark)
+        
+        mark = time.perf_counter()
+        result = orjson.loads(response.content)
+        decode_ms = _elapsed_ms(mark)
+        
+        logger.info(
+            f"gigachat_request token_ms={token_ms:.1f} encode_ms={encode_ms:.1f} "
+            f"post_ms={post_ms:.1f} decode_ms={decode_ms:.1f} total_ms={_elapsed_ms(started):.1f}"
+        )
+        return result['choices'][0]['message']['content']
+    
+    async def _astream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> AsyncIterator[str]:
+        """
+        Выполняет потоковый запрос к chat/completions.
+        
+        Args:
+            messages: Список сообщений для GigaChat
+            temperature: Температура
+            max_tokens: Макс токены
+        
+        Yields:
+            Части ответа
+        """
+        started = time.perf_counter()
+        first_byte_ms = None
+        
+        await self._get_access_token()
+        
+        payload = self._build_payload(messages, temperature, max_tokens, stream=True)
+        
+        response = await self._send(
+            'POST',
+            f"{self.api_base_url}/chat/completions",
+            stream=True,
+            headers=self._json_headers,
+            content=self._encoder.encode(payload)
+        )
+        try:
+            response.raise_for_status()
+            
+            async for line in _aiter_lines(response):
+                if first_byte_ms is None and line:
+                    first_byte_ms = _elapsed_ms(started)
+                
+                done, content = self._parse_sse_line(line)
+                if done:
+                    break
+                if content:
+                    yield content
+        finally:
+            await response.aclose()
+        
+        logger.info(
+            f"gigachat_stream first_byte_ms={first_byte_ms or 0.0:.1f} "
+            f"total_ms={_elapsed_ms(started):.1f}"
+        )
+    
+    async def get_models(self) -> List[str]:
+        """
+        Получает список доступных моделей.
+        
+        Returns:
+            Список названий моделей
+        """
+        try:
+            await self._get_access_token()
+            
+            response = await self._send('GET', f"{self.api_base_url}/models")
+            response.raise_for_status()
+            
+            models_data = orjson.loads(response.content)
+            models = [model['id'] for model in models_data.get('data', [])]
+            
+            logger.info(f"Получены модели: {models}")
+            return models
+        
+        except Exception as e:
+            logger.error(f"Ошибка получения списка моделей: {e}")
+            raise
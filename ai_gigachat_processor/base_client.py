@@ -0,0 +1,328 @@
+"""
+Общая часть синхронного и асинхронного клиентов GigaChat.
+Конфигурация, заголовки OAuth, общий кеш токенов, тело запроса
+и разбор потокового ответа.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple, Union
+
+import orjson
+
+from utils.response_cache import ResponseCache
+
+from .config import GigaChatConfig
+
+logger = logging.getLogger(__name__)
+
+# Маркеры потока Server-Sent Events
+SSE_DATA_PREFIX = b'data: '
+SSE_DATA_OFFSET = len(SSE_DATA_PREFIX)
+SSE_DONE = b'[DONE]'
+SSE_COMMENT = b':'
+
+# Повторы запросов: только ошибки соединения и ответы, означающие, что
+# сервер запрос не выполнил. Ошибки чтения не повторяются:
+# chat/completions не идемпотентен
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.3
+
+# Фоновое обновление токена за 2 минуты до истечения
+TOKEN_REFRESH_MARGIN = 120
+
+
+def _elapsed_ms(started: float) -> float:
+    """Возвращает время в миллисекундах, прошедшее с отметки time.perf_counter()."""
+    return (time.perf_counter() - started) * 1000
+
+
+class PayloadEncoder:
+    """
+    Сериализует тело запроса к chat/completions.
+    
+    История диалога между запросами почти не меняется, поэтому JSON каждого
+    сообщения запоминается и при следующем запросе вставляется готовым:
+    заново сериализуются только новые сообщения.
+    """
+    
+    def __init__(self, max_size: int = 1024):
+        """
+        Инициализирует кодировщик.
+        
+        Args:
+            max_size: Максимальное количество запомненных сообщений
+        """
+        self.max_size = max_size
+        self._fragments: Dict[Tuple[str, str], bytes] = {}
+    
+    def encode(self, payload: Dict) -> bytes:
+        """
+        Сериализует payload в JSON.
+        
+        Args:
+            payload: Тело запроса с ключом "messages"
+        
+        Returns:
+            JSON в виде bytes
+        """
+        fragments = []
+        for message in payload["messages"]:
+            # Запоминаем только обычные сообщения вида {"role", "content"}
+            # с текстовым content; остальные (function_call, name,
+            # мультимодальный content) сериализуются каждый раз
+            content = message.get("content")
+            if message.keys() != {"role", "content"} or type(content) is not str:
+                fragments.append(orjson.dumps(message))
+                continue
+            
+            key = (message["role"], content)
+            fragment = self._fragments.get(key)
+            if fragment is None:
+                fragment = orjson.dumps(message)
+                if len(self._fragments) >= self.max_size:
+                    self._fragments.clear()
+                self._fragments[key] = fragment
+            fragments.append(fragment)
+        
+        rest = orjson.dumps({k: v for k, v in payload.items() if k != "messages"})
+        body = b'{"messages":[' + b",".join(fragments) + b"]"
+        if rest == b"{}":
+            return body + b"}"
+        return body + b"," + rest[1:]
+
+
+class GigaChatBase:
+    """
+    Общая часть клиентов GigaChat.
+    
+    Используется вместе с BaseLLMClient или AsyncBaseLLMClient. Наследник
+    реализует _on_token_changed: куда записать заголовок Authorization
+    и как запланировать фоновое обновление токена.
+    """
+    
+    OAUTH_URL = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
+    API_BASE_URL = "https://gigachat.devices.sberbank.ru/api/v1"
+    
+    # Общий для всех экземпляров кеш токенов: (authorization_key, scope) -> (token, expires_at)
+    _TOKEN_CACHE: Dict[Tuple[str, str], Tuple[str, float]] = {}
+    # Блокировки получения токена по ключу: экземпляры с одним ключом
+    # запрашивают OAuth по очереди, и следующий берет токен из кеша
+    _TOKEN_FETCH_LOCKS: Dict[Tuple[str, str], threading.Lock] = {}
+    _TOKEN_CACHE_LOCK = threading.Lock()
+    
+    def __init__(
+        self,
+        authorization_key: str = None,
+        model: str = "GigaChat",
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        scope: str = "GIGACHAT_API_PERS",
+        config: GigaChatConfig = None,
+        cache: Optional[ResponseCache] = None
+    ):
+        """
+        Инициализирует общие параметры клиента GigaChat.
+        
+        Args:
+            authorization_key: Authorization key в формате Basic <key>
+            model: Модель для использования (GigaChat, GigaChat-Pro, GigaChat-Plus)
+            temperature: Температура генерации (0.0 - 2.0)
+            max_tokens: Максимальное количество токенов
+            scope: Область доступа API
+            config: Объект конфигурации (опционально, переопределяет другие параметры)
+            cache: Кеш ответов (опционально)
+        """
+        # Если передана конфигурация, используем её
+        if config:
+            super().__init__(config.model, config.temperature, config.max_tokens, cache)
+            self.authorization_key = config.authorization_key
+            self.scope = config.scope
+            self.oauth_url = config.oauth_url
+            self.api_base_url = config.api_base_url
+            self.verify_ssl = config.verify_ssl
+            self.timeout = config.timeout
+        else:
+            # Иначе используем переданные параметры
+            if not authorization_key:
+                raise ValueError("authorization_key или config должны быть указаны")
+            super().__init__(model, temperature, max_tokens, cache)
+            self.authorization_key = authorization_key
+            self.scope = scope
+            self.oauth_url = self.OAUTH_URL
+            self.api_base_url = self.API_BASE_URL
+            self.verify_ssl = True
+            self.timeout = 30
+        
+        # Заголовки OAuth не меняются между запросами, кроме RqUID
+        self._oauth_headers = {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Accept': 'application/json',
+            'Authorization': f'Basic {self.authorization_key}'
+        }
+        self._oauth_payload = {'scope': self.scope}
+        # Тело запросов сериализуется через orjson и передается готовыми байтами
+        self._json_headers = {'Content-Type': 'application/json'}
+        self._encoder = PayloadEncoder()
+        # Неизменная часть тела запроса; на вызов копируется и дополняется
+        self._payload_template = {
+            "model": self.model,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+        }
+        
+        # Access token будет получен при первом запросе
+        self._token_key = (self.authorization_key, self.scope)
+        self._access_token: Optional[str] = None
+        self._token_expires_at: float = 0
+        self._closed = False
+    
+    def _oauth_request_headers(self) -> Dict[str, str]:
+        """Заголовки запроса токена с новым RqUID."""
+        return {**self._oauth_headers, 'RqUID': str(uuid.uuid4())}
+    
+    def _token_is_valid(self) -> bool:
+        """Проверяет, что текущий токен есть и еще не истек."""
+        return bool(self._access_token) and time.time() < self._token_expires_at
+    
+    @staticmethod
+    def _token_expires_in(token_data: Dict) -> float:
+        """
+        Вычисляет, сколько секунд можно использовать полученный токен.
+        
+        Args:
+            token_data: Ответ OAuth эндпоинта
+        
+        Returns:
+            Время жизни токена в секундах с запасом 5 минут
+        """
+        # expires_at приходит как Unix-время в миллисекундах
+        # (токен живет около 30 минут). Вычитаем 5 минут для запаса
+        expires_at = token_data.get('expires_at')
+        lifetime = expires_at / 1000 - time.time() if expires_at else 1800
+        return max(lifetime - 300, 0)
+    
+    def _token_fetch_lock(self) -> threading.Lock:
+        """Блокировка получения токена для ключа этого клиента."""
+        with self._TOKEN_CACHE_LOCK:
+            return self._TOKEN_FETCH_LOCKS.setdefault(self._token_key, threading.Lock())
+    
+    def _adopt_cached_token(self, stale_token: Optional[str] = None) -> Optional[str]:
+        """
+        Берет токен из общего кеша, если другой экземпляр с тем же ключом
+        уже получил действительный токен.
+        
+        Args:
+            stale_token: Токен, который нужно заменить; он из кеша не берется
+        
+        Returns:
+            Access token или None, если подходящего токена в кеше нет
+        """
+        with self._TOKEN_CACHE_LOCK:
+            cached = self._TOKEN_CACHE.get(self._token_key)
+        if not cached or time.time() >= cached[1] or cached[0] == stale_token:
+            return None
+        
+        token, expires_at = cached
+        self._set_token(token, expires_at)
+        logger.info("Access token взят из общего кеша")
+        return token
+    
+    def _store_token(self, token_data: Dict) -> str:
+        """
+        Запоминает токен из ответа OAuth и кладет его в общий кеш.
+        
+        Args:
+            token_data: Ответ OAuth эндпоинта
+        
+        Returns:
+            Access token
+        """
+        token = token_data['access_token']
+        expires_at = time.time() + self._token_expires_in(token_data)
+        with self._TOKEN_CACHE_LOCK:
+            self._TOKEN_CACHE[self._token_key] = (token, expires_at)
+        self._set_token(token, expires_at)
+        return token
+    
+    def _set_token(self, token: str, expires_at: float):
+        """Делает токен текущим для клиента."""
+        self._access_token = token
+        self._token_expires_at = expires_at
+        self._on_token_changed(token, expires_at)
+    
+    def _on_token_changed(self, token: str, expires_at: float):
+        """
+        Применяет новый токен: заголовок Authorization и фоновое обновление.
+        
+        Args:
+            token: Access token
+            expires_at: Время истечения (Unix-время)
+        """
+        raise NotImplementedError
+    
+    def _build_payload(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None,
+        stream: bool = False
+    ) -> Dict:
+        """
+        Собирает тело запроса к chat/completions из заготовки.
+        
+        Args:
+            messages: Список сообщений
+            temperature: Температура (опционально)
+            max_tokens: Макс токены (опционально)
+            stream: Потоковая передача ответа
+        
+        Returns:
+            Тело запроса
+        """
+        payload = self._payload_template.copy()
+        payload["messages"] = messages
+        if temperature is not None:
+            payload["temperature"] = temperature
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        if stream:
+            payload["stream"] = True
+        return payload
+    
+    @staticmethod
+    def _parse_sse_line(line: Union[bytes, str]) -> Tuple[bool, Optional[str]]:
+        """
+        Разбирает строку потока Server-Sent Events.
+        
+        Args:
+            line: Строка потока без перевода строки
+        
+        Returns:
+            Кортеж (поток завершен, часть ответа или None)
+        """
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+        
+        # Разделители событий и комментарии (keepalive) отбрасываются
+        # до любых сравнений и разбора
+        if not line or line[:1] == SSE_COMMENT or not line.startswith(SSE_DATA_PREFIX):
+            return False, None
+        
+        # memoryview: orjson читает данные без копирования среза
+        data = memoryview(line)[SSE_DATA_OFFSET:]
+        if data == SSE_DONE:
+            return True, None
+        
+        try:
+            chunk_data = orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return False, None
+        
+        choices = chunk_data.get('choices')
+        if choices:
+            return False, choices[0].get('delta', {}).get('content') or None
+        return False, None
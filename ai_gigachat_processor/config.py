@@ -41,6 +41,10 @@ class GigaChatConfig:
         - GIGACHAT_MAX_TOKENS: макс токены (опционально)
         """
         import os
+        from config.settings import load_env_file
+        
+        # .env читается один раз за процесс, общий кеш с Settings.from_env
+        load_env_file()
         
         auth_key = os.getenv("GIGACHAT_AUTHORIZATION_KEY")
         if not auth_key:
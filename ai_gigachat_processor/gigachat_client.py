@@ -4,12 +4,28 @@
 """
 
 import requests
+import orjson
 import logging
+import threading
 import time
-import uuid
-from typing import List, Dict, Optional, Union
+import weakref
+from typing import Iterator, List, Dict, Optional
+from urllib.parse import urlsplit
 import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from ai_processor.base_client import BaseLLMClient
+from utils.response_cache import ResponseCache
+
+from .base_client import (
+    MAX_RETRIES,
+    RETRY_BACKOFF,
+    RETRY_STATUSES,
+    TOKEN_REFRESH_MARGIN,
+    GigaChatBase,
+    _elapsed_ms,
+)
 from .config import GigaChatConfig
 
 logger = logging.getLogger(__name__)
@@ -18,11 +34,23 @@ logger = logging.getLogger(__name__)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
-class GigaChatClient:
-    """Клиент для GigaChat API."""
+def _refresh_token_later(client_ref: "weakref.ref"):
+    """
+    Обновляет токен клиента по таймеру.
+    
+    Таймер держит только слабую ссылку: клиент, который больше
+    не используется, удаляется сборщиком мусора, и обновление не выполняется.
     
-    OAUTH_URL = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
-    API_BASE_URL = "https://gigachat.devices.sberbank.ru/api/v1"
+    Args:
+        client_ref: Слабая ссылка на GigaChatClient
+    """
+    client = client_ref()
+    if client is not None:
+        client._refresh_token_in_background()
+
+
+class GigaChatClient(GigaChatBase, BaseLLMClient):
+    """Клиент для GigaChat API."""
     
     def __init__(
         self,
@@ -31,7 +59,8 @@ class GigaChatClient:
         temperature: float = 0.7,
         max_tokens: int = 1000,
         scope: str = "GIGACHAT_API_PERS",
-        config: GigaChatConfig = None
+        config: GigaChatConfig = None,
+        cache: Optional[ResponseCache] = None
     ):
         """
         Инициализирует GigaChat клиент.
@@ -43,205 +72,296 @@ class GigaChatClient:
             max_tokens: Максимальное количество токенов
             scope: Область доступа API
             config: Объект конфигурации (опционально, переопределяет другие параметры)
+            cache: Кеш ответов (опционально)
         """
-        # Если передана конфигурация, используем её
-        if config:
-            self.authorization_key = config.authorization_key
-            self.model = config.model
-            self.temperature = config.temperature
-            self.max_tokens = config.max_tokens
-            self.scope = config.scope
-            self.oauth_url = config.oauth_url
-            self.api_base_url = config.api_base_url
-            self.verify_ssl = config.verify_ssl
-            self.timeout = config.timeout
-        else:
-            # Иначе используем переданные параметры
-            if not authorization_key:
-                raise ValueError("authorization_key или config должны быть указаны")
-            self.authorization_key = authorization_key
-            self.model = model
-            self.temperature = temperature
-            self.max_tokens = max_tokens
-            self.scope = scope
-            self.oauth_url = self.OAUTH_URL
-            self.api_base_url = self.API_BASE_URL
-            self.verify_ssl = True
-            self.timeout = 30
+        super().__init__(
+            authorization_key, model, temperature, max_tokens, scope, config, cache
+        )
         
-        # Access token будет получен при первом запросе
-        self._access_token: Optional[str] = None
-        self._token_expires_at: float = 0
+        # Фоновое обновление токена до истечения, чтобы запросы
+        # пользователей не ждали OAuth. Блокировка гарантирует, что
+        # параллельные запросы обновляют токен только один раз
+        self._refresh_lock = threading.Lock()
+        self._refresh_timer: Optional[threading.Timer] = None
+        
+        # Одна HTTP-сессия на клиент: keep-alive и пул соединений
+        # избавляют от TCP/TLS рукопожатия на каждом запросе
+        self._session = self._create_session()
         
         logger.info(f"GigaChat клиент инициализирован: модель={self.model}")
     
-    def _get_access_token(self) -> str:
+    def _create_session(self) -> requests.Session:
+        """
+        Создает HTTP-сессию с пулом соединений для хостов GigaChat.
+        
+        Returns:
+            Настроенная сессия requests
+        """
+        session = requests.Session()
+        session.verify = self.verify_ssl
+        session.headers['Accept'] = 'application/json'
+        
+        # Повторяются только запросы, которые сервер точно не выполнил:
+        # ошибки соединения и ответы 429/5xx (с учетом Retry-After). Ошибки
+        # и таймауты чтения не повторяются: chat/completions не идемпотентен,
+        # и медленная, но успешная генерация была бы отправлена и оплачена
+        # повторно
+        # Хостов всего два (OAuth и API), а пул каждого рассчитан на пики
+        # параллельных сообщений: лишние соединения не блокируют запрос,
+        # а закрываются после него, без предупреждений "pool is full"
+        adapter = HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=64,
+            pool_block=False,
+            max_retries=Retry(
+                total=MAX_RETRIES,
+                connect=MAX_RETRIES,
+                read=0,
+                other=0,
+                status=MAX_RETRIES,
+                backoff_factor=RETRY_BACKOFF,
+                status_forcelist=sorted(RETRY_STATUSES),
+                allowed_methods=frozenset(['POST', 'GET']),
+                respect_retry_after_header=True
+            )
+        )
+        for url in (self.oauth_url, self.api_base_url):
+            parts = urlsplit(url)
+            session.mount(f"{parts.scheme}://{parts.hostname}", adapter)
+        
+        return session
+    
+    def close(self):
+        """Закрывает HTTP-сессию и освобождает соединения."""
+        self._closed = True
+        self._cancel_token_refresh()
+        self._session.close()
+        logger.info("GigaChat клиент закрыт")
+    
+    def __del__(self):
+        # Клиент без close(): таймер обновления токена не должен пережить его
+        if getattr(self, "_refresh_timer", None) is not None:
+            self._refresh_timer.cancel()
+    
+    def __enter__(self) -> "GigaChatClient":
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    def _get_access_token(self, force: bool = False) -> str:
         """
         Получает access token для авторизации запросов.
         Кеширует токен и обновляет его при необходимости.
         
+        Args:
+            force: Обновить токен, даже если текущий еще действителен
+        
         Returns:
             Access token
         """
-        # Проверяем, есть ли валидный токен
-        if self._access_token and time.time() < self._token_expires_at:
+        # Быстрый путь без блокировки: токен еще действителен
+        if not force and self._token_is_valid():
             return self._access_token
         
-        # Получаем новый токен
-        try:
-            headers = {
-                'Content-Type': 'application/x-www-form-urlencoded',
-                'Accept': 'application/json',
-                'RqUID': str(uuid.uuid4()),
-                'Authorization': f'Basic {self.authorization_key}'
-            }
+        # Обновляет токен только один поток, остальные ждут его результат
+        with self._refresh_lock:
+            if not force and self._token_is_valid():
+                return self._access_token
+            return self._fetch_access_token(stale_token=self._access_token if force else None)
+    
+    def _fetch_access_token(self, stale_token: Optional[str] = None) -> str:
+        """
+        Получает новый токен из общего кеша или через OAuth.
+        Вызывается только под self._refresh_lock.
+        
+        Args:
+            stale_token: Токен, который нужно заменить (при принудительном
+                обновлении); из кеша берется только другой токен
             
-            payload = {
-                'scope': self.scope
-            }
+        Returns:
+            Access token
+        """
+        with self._token_fetch_lock():
+            # Токен мог получить другой экземпляр клиента с тем же ключом,
+            # в том числе пока этот ждал блокировку
+            token = self._adopt_cached_token(stale_token)
+            if token:
+                return token
             
-            response = requests.post(
+            return self._request_access_token()
+    
+    def _request_access_token(self) -> str:
+        """
+        Получает новый токен через OAuth и сохраняет его в общем кеше.
+        
+        Returns:
+            Access token
+        """
+        try:
+            started = time.perf_counter()
+            response = self._session.post(
                 self.oauth_url,
-                headers=headers,
-                data=payload,
-                verify=self.verify_ssl,
+                headers=self._oauth_request_headers(),
+                data=self._oauth_payload,
                 timeout=self.timeout
             )
             response.raise_for_status()
             
-            token_data = response.json()
-            self._access_token = token_data['access_token']
+            token = self._store_token(response.json())
             
-            # Устанавливаем время истечения токена (обычно 30 минут)
-            # Вычитаем 5 минут для запаса
-            expires_in = token_data.get('expires_at', 1800) - 300
-            self._token_expires_at = time.time() + expires_in
-            
-            logger.info("Access token успешно получен")
-            return self._access_token
+            logger.info(f"Access token успешно получен: oauth_ms={_elapsed_ms(started):.1f}")
+            return token
             
         except Exception as e:
             logger.error(f"Ошибка получения access token: {e}")
             raise
     
-    def generate_response(
+    def _on_token_changed(self, token: str, expires_at: float):
+        """
+        Сохраняет токен в сессии и планирует его обновление.
+        
+        Args:
+            token: Access token
+            expires_at: Время истечения (Unix-время)
+        """
+        # Токен хранится в сессии, чтобы не передавать его в каждом запросе
+        self._session.headers['Authorization'] = f'Bearer {token}'
+        self._schedule_token_refresh(expires_at - time.time())
+    
+    def _schedule_token_refresh(self, expires_in: float):
+        """
+        Планирует фоновое обновление токена за 2 минуты до истечения.
+        
+        Args:
+            expires_in: Время жизни токена в секундах
+        """
+        self._cancel_token_refresh()
+        
+        # Слишком короткоживущий токен обновится синхронно при запросе
+        if expires_in <= TOKEN_REFRESH_MARGIN or self._closed:
+            return
+        
+        self._refresh_timer = threading.Timer(
+            expires_in - TOKEN_REFRESH_MARGIN,
+            _refresh_token_later,
+            args=(weakref.ref(self),)
+        )
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+    
+    def _cancel_token_refresh(self):
+        """Отменяет запланированное фоновое обновление токена."""
+        if self._refresh_timer:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
+    
+    def _refresh_token_in_background(self):
+        """Обновляет токен вне пути обработки запросов."""
+        try:
+            self._get_access_token(force=True)
+        except Exception as e:
+            # Токен будет получен синхронно при следующем запросе
+            logger.warning(f"Фоновое обновление токена не удалось: {e}")
+    
+    def _complete(
         self,
         messages: List[Dict[str, str]],
-        temperature: float = None,
-        max_tokens: int = None
+        temperature: float,
+        max_tokens: int
     ) -> str:
         """
-        Генерирует ответ с помощью GigaChat.
+        Выполняет запрос к chat/completions.
         
         Args:
-            messages: Список сообщений для GigaChat (формат: [{"role": "user/assistant/system", "content": "text"}])
-            temperature: Температура (опционально)
-            max_tokens: Макс токены (опционально)
+            messages: Список сообщений для GigaChat
+            temperature: Температура
+            max_tokens: Макс токены
             
         Returns:
-            Сгенерированный ответ
+            Текст ответа
         """
-        try:
-            access_token = self._get_access_token()
-            
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'Authorization': f'Bearer {access_token}'
-            }
-            
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": temperature if temperature is not None else self.temperature,
-                "max_tokens": max_tokens if max_tokens is not None else self.max_tokens,
-            }
-            
-            response = requests.post(
-                f"{self.api_base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                verify=self.verify_ssl,
-                timeout=self.timeout
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            answer = result['choices'][0]['message']['content']
-            
-            logger.info(f"Ответ сгенерирован: {len(answer)} символов")
-            return answer
-            
-        except Exception as e:
-            logger.error(f"Ошибка генерации ответа: {e}")
-            raise
+        started = time.perf_counter()
+        
+        # Authorization: Bearer хранится в заголовках сессии
+        self._get_access_token()
+        token_ms = _elapsed_ms(started)
+        
+        mark = time.perf_counter()
+        payload = self._build_payload(messages, temperature, max_tokens)
+        body = self._encoder.encode(payload)
+        encode_ms = _elapsed_ms(mark)
+        
+        mark = time.perf_counter()
+        response = self._session.post(
+            f"{self.api_base_url}/chat/completions",
+            headers=self._json_headers,
+            data=body,
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        post_ms = _elapsed_ms(mark)
+        
+        mark = time.perf_counter()
+        result = orjson.loads(response.content)
+        decode_ms = _elapsed_ms(mark)
+        
+        logger.info(
+            f"gigachat_request token_ms={token_ms:.1f} encode_ms={encode_ms:.1f} "
+            f"post_ms={post_ms:.1f} decode_ms={decode_ms:.1f} total_ms={_elapsed_ms(started):.1f}"
+        )
+        return result['choices'][0]['message']['content']
     
-    def generate_streaming_response(
+    def _stream(
         self,
         messages: List[Dict[str, str]],
-        temperature: float = None,
-        max_tokens: int = None
-    ):
+        temperature: float,
+        max_tokens: int
+    ) -> Iterator[str]:
         """
-        Генерирует ответ с потоковой передачей.
+        Выполняет потоковый запрос к chat/completions.
         
         Args:
             messages: Список сообщений для GigaChat
-            temperature: Температура (опционально)
-            max_tokens: Макс токены (опционально)
+            temperature: Температура
+            max_tokens: Макс токены
             
         Yields:
             Части ответа
         """
-        try:
-            access_token = self._get_access_token()
-            
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'Authorization': f'Bearer {access_token}'
-            }
-            
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": temperature if temperature is not None else self.temperature,
-                "max_tokens": max_tokens if max_tokens is not None else self.max_tokens,
-                "stream": True
-            }
-            
-            response = requests.post(
-                f"{self.api_base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                verify=self.verify_ssl,
-                timeout=self.timeout,
-                stream=True
-            )
-            response.raise_for_status()
+        started = time.perf_counter()
+        first_byte_ms = None
+        
+        # Authorization: Bearer хранится в заголовках сессии
+        self._get_access_token()
+        
+        payload = self._build_payload(messages, temperature, max_tokens, stream=True)
+        
+        response = self._session.post(
+            f"{self.api_base_url}/chat/completions",
+            headers=self._json_headers,
+            data=self._encoder.encode(payload),
+            timeout=self.timeout,
+            stream=True
+        )
+        response.raise_for_status()
+        
+        # Строки обрабатываются как bytes: orjson разбирает их напрямую,
+        # без decode('utf-8'); крупный chunk_size сокращает число чтений
+        for line in response.iter_lines(chunk_size=8192):
+            if first_byte_ms is None and line:
+                first_byte_ms = _elapsed_ms(started)
             
-            for line in response.iter_lines():
-                if line:
-                    line_text = line.decode('utf-8')
-                    if line_text.startswith('data: '):
-                        data_text = line_text[6:]  # Убираем 'data: '
-                        if data_text == '[DONE]':
-                            break
-                        
-                        try:
-                            import json
-                            chunk_data = json.loads(data_text)
-                            if 'choices' in chunk_data and len(chunk_data['choices']) > 0:
-                                delta = chunk_data['choices'][0].get('delta', {})
-                                content = delta.get('content')
-                                if content:
-                                    yield content
-                        except json.JSONDecodeError:
-                            continue
+            done, content = self._parse_sse_line(line)
+            if done:
+                break
+            if content:
+                yield content
         
-        except Exception as e:
-            logger.error(f"Ошибка streaming генерации: {e}")
-            raise
+        logger.info(
+            f"gigachat_stream first_byte_ms={first_byte_ms or 0.0:.1f} "
+            f"total_ms={_elapsed_ms(started):.1f}"
+        )
     
     def get_models(self) -> List[str]:
         """
@@ -251,17 +371,10 @@ class GigaChatClient:
             Список названий моделей
         """
         try:
-            access_token = self._get_access_token()
-            
-            headers = {
-                'Accept': 'application/json',
-                'Authorization': f'Bearer {access_token}'
-            }
+            self._get_access_token()
             
-            response = requests.get(
+            response = self._session.get(
                 f"{self.api_base_url}/models",
-                headers=headers,
-                verify=self.verify_ssl,
                 timeout=self.timeout
             )
             response.raise_for_status()
@@ -3,10 +3,13 @@
 Формирует финальные ответы на основе контекста и запроса с использованием GigaChat.
 """
 
-from typing import List, Dict
+from typing import List, Dict, Union
+import asyncio
+import inspect
 import logging
 
 from .gigachat_client import GigaChatClient
+from .async_gigachat_client import AsyncGigaChatClient
 
 logger = logging.getLogger(__name__)
 
@@ -30,14 +33,15 @@ class ResponseGenerator:
     
     def __init__(
         self,
-        gigachat_client: GigaChatClient,
+        gigachat_client: Union[GigaChatClient, AsyncGigaChatClient],
         system_prompt: str = None
     ):
         """
         Инициализирует генератор ответов.
         
         Args:
-            gigachat_client: Клиент GigaChat
+            gigachat_client: Клиент GigaChat (синхронный или асинхронный;
+                с асинхронным клиентом используйте agenerate)
             system_prompt: Системный промпт (опционально)
         """
         self.gigachat_client = gigachat_client
@@ -61,6 +65,81 @@ class ResponseGenerator:
             
         Returns:
             Сгенерированный ответ
+            
+        Raises:
+            TypeError: Если клиент асинхронный
+        """
+        if inspect.iscoroutinefunction(self.gigachat_client.generate_response):
+            raise TypeError(
+                "generate() не поддерживает асинхронный клиент GigaChat, "
+                "используйте agenerate()"
+            )
+        
+        messages = self._build_messages(query, context_documents, conversation_history)
+        
+        # Генерируем ответ
+        try:
+            answer = self.gigachat_client.generate_response(messages)
+            return answer
+        except Exception as e:
+            logger.error(f"Ошибка генерации ответа: {e}")
+            return f"Извините, произошла ошибка при генерации ответа: {str(e)}"
+    
+    async def agenerate(
+        self,
+        query: str,
+        context_documents: List[Dict],
+        conversation_history: List[Dict] = None
+    ) -> str:
+        """
+        Асинхронно генерирует ответ, не блокируя event loop.
+        
+        Args:
+            query: Вопрос пользователя
+            context_documents: Документы из базы знаний
+            conversation_history: История диалога (опционально)
+            
+        Returns:
+            Сгенерированный ответ
+        """
+        messages = self._build_messages(query, context_documents, conversation_history)
+        
+        try:
+            if inspect.iscoroutinefunction(self.gigachat_client.generate_response):
+                answer = await self.gigachat_client.generate_response(messages)
+            else:
+                # Синхронный клиент выполняем в отдельном потоке
+                answer = await asyncio.to_thread(
+                    self.gigachat_client.generate_response, messages
+                )
+            return answer
+        except Exception as e:
+            logger.error(f"Ошибка генерации ответа: {e}")
+            return f"Извините, произошла ошибка при генерации ответа: {str(e)}"
+    
+    async def aclose(self):
+        """Закрывает клиент GigaChat и освобождает соединения."""
+        if inspect.iscoroutinefunction(getattr(self.gigachat_client, "aclose", None)):
+            await self.gigachat_client.aclose()
+        else:
+            self.gigachat_client.close()
+    
+    def _build_messages(
+        self,
+        query: str,
+        context_documents: List[Dict],
+        conversation_history: List[Dict] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Формирует список сообщений для GigaChat.
+        
+        Args:
+            query: Вопрос пользователя
+            context_documents: Документы из базы знаний
+            conversation_history: История диалога (опционально)
+            
+        Returns:
+            Список сообщений
         """
         # Формируем контекст из документов
         if not context_documents:
@@ -100,13 +179,7 @@ class ResponseGenerator:
         # Добавляем текущий запрос
         messages.append({"role": "user", "content": user_prompt})
         
-        # Генерируем ответ
-        try:
-            answer = self.gigachat_client.generate_response(messages)
-            return answer
-        except Exception as e:
-            logger.error(f"Ошибка генерации ответа: {e}")
-            return f"Извините, произошла ошибка при генерации ответа: {str(e)}"
+        return messages
     
     def format_response_with_sources(
         self,
@@ -1,7 +1,8 @@
 """Модуль обработки запросов через ИИ."""
 
+from .base_client import AsyncBaseLLMClient, BaseLLMClient, LLMClient
 from .openai_client import OpenAIClient
 from .response_generator import ResponseGenerator
 
-__all__ = ["OpenAIClient", "ResponseGenerator"]
+__all__ = ["LLMClient", "BaseLLMClient", "AsyncBaseLLMClient", "OpenAIClient", "ResponseGenerator"]
 
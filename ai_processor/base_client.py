@@ -0,0 +1,257 @@
+"""
+Общий интерфейс клиентов языковых моделей.
+Содержит логику, одинаковую для OpenAI и GigaChat: параметры генерации,
+кеш ответов и журналирование.
+"""
+
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Protocol, Tuple
+import asyncio
+import logging
+import time
+
+from utils.response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+class LLMClient(Protocol):
+    """Интерфейс клиента языковой модели, которым пользуется ResponseGenerator."""
+    
+    def generate_response(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None
+    ) -> str:
+        ...
+
+
+class _LLMClientParams:
+    """Параметры генерации и кеш, общие для синхронных и асинхронных клиентов."""
+    
+    def __init__(
+        self,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        cache: Optional[ResponseCache] = None
+    ):
+        """
+        Инициализирует общие параметры клиента.
+        
+        Args:
+            model: Модель для использования
+            temperature: Температура генерации
+            max_tokens: Максимальное количество токенов
+            cache: Кеш ответов (опционально)
+        """
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.cache = cache
+    
+    def _resolve_params(
+        self,
+        temperature: Optional[float],
+        max_tokens: Optional[int]
+    ) -> Tuple[float, int]:
+        """Подставляет параметры клиента вместо незаданных."""
+        return (
+            temperature if temperature is not None else self.temperature,
+            max_tokens if max_tokens is not None else self.max_tokens
+        )
+
+
+class BaseLLMClient(_LLMClientParams, ABC):
+    """
+    Базовый клиент языковой модели.
+    
+    Наследники реализуют только обращение к API (_complete и _stream);
+    подстановка параметров по умолчанию, кеш и журналирование общие.
+    """
+    
+    def generate_response(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None
+    ) -> str:
+        """
+        Генерирует ответ модели.
+        
+        Args:
+            messages: Список сообщений (формат: [{"role": "user/assistant/system", "content": "text"}])
+            temperature: Температура (опционально)
+            max_tokens: Макс токены (опционально)
+        
+        Returns:
+            Сгенерированный ответ
+        """
+        temperature, max_tokens = self._resolve_params(temperature, max_tokens)
+        
+        use_cache = self.cache is not None and self.cache.accepts(temperature)
+        if use_cache:
+            cached = self.cache.get(messages, self.model, temperature, max_tokens)
+            if cached is not None:
+                return cached
+        
+        started = time.perf_counter()
+        try:
+            answer = self._complete(messages, temperature, max_tokens)
+        except Exception as e:
+            logger.error(f"Ошибка генерации ответа: {e}")
+            raise
+        
+        logger.info(
+            f"Ответ сгенерирован: {len(answer)} символов, "
+            f"total_ms={(time.perf_counter() - started) * 1000:.1f}"
+        )
+        
+        if use_cache:
+            self.cache.put(messages, self.model, temperature, max_tokens, answer)
+        
+        return answer
+    
+    def generate_streaming_response(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None
+    ) -> Iterator[str]:
+        """
+        Генерирует ответ с потоковой передачей.
+        
+        Args:
+            messages: Список сообщений
+            temperature: Температура (опционально)
+            max_tokens: Макс токены (опционально)
+        
+        Yields:
+            Части ответа
+        """
+        temperature, max_tokens = self._resolve_params(temperature, max_tokens)
+        
+        try:
+            yield from self._stream(messages, temperature, max_tokens)
+        except Exception as e:
+            logger.error(f"Ошибка streaming генерации: {e}")
+            raise
+    
+    @abstractmethod
+    def _complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> str:
+        """Выполняет запрос к API и возвращает текст ответа."""
+    
+    @abstractmethod
+    def _stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> Iterator[str]:
+        """Выполняет потоковый запрос к API и отдает части ответа."""
+
+
+class AsyncBaseLLMClient(_LLMClientParams, ABC):
+    """
+    Базовый асинхронный клиент языковой модели.
+    
+    То же, что BaseLLMClient, для клиентов на asyncio: наследники реализуют
+    _acomplete и _astream. Кеш ответов синхронный (приблизительный поиск
+    может обращаться к API эмбеддингов), поэтому вызывается в отдельном потоке.
+    """
+    
+    async def generate_response(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None
+    ) -> str:
+        """
+        Генерирует ответ модели.
+        
+        Args:
+            messages: Список сообщений (формат: [{"role": "user/assistant/system", "content": "text"}])
+            temperature: Температура (опционально)
+            max_tokens: Макс токены (опционально)
+        
+        Returns:
+            Сгенерированный ответ
+        """
+        temperature, max_tokens = self._resolve_params(temperature, max_tokens)
+        
+        use_cache = self.cache is not None and self.cache.accepts(temperature)
+        if use_cache:
+            cached = await asyncio.to_thread(
+                self.cache.get, messages, self.model, temperature, max_tokens
+            )
+            if cached is not None:
+                return cached
+        
+        started = time.perf_counter()
+        try:
+            answer = await self._acomplete(messages, temperature, max_tokens)
+        except Exception as e:
+            logger.error(f"Ошибка генерации ответа: {e}")
+            raise
+        
+        logger.info(
+            f"Ответ сгенерирован: {len(answer)} символов, "
+            f"total_ms={(time.perf_counter() - started) * 1000:.1f}"
+        )
+        
+        if use_cache:
+            await asyncio.to_thread(
+                self.cache.put, messages, self.model, temperature, max_tokens, answer
+            )
+        
+        return answer
+    
+    async def generate_streaming_response(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None
+    ) -> AsyncIterator[str]:
+        """
+        Генерирует ответ с потоковой передачей.
+        
+        Args:
+            messages: Список сообщений
+            temperature: Температура (опционально)
+            max_tokens: Макс токены (опционально)
+        
+        Yields:
+            Части ответа
+        """
+        temperature, max_tokens = self._resolve_params(temperature, max_tokens)
+        
+        try:
+            async for part in self._astream(messages, temperature, max_tokens):
+                yield part
+        except Exception as e:
+            logger.error(f"Ошибка streaming генерации: {e}")
+            raise
+    
+    @abstractmethod
+    async def _acomplete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> str:
+        """Выполняет запрос к API и возвращает текст ответа."""
+    
+    @abstractmethod
+    def _astream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int
+    ) -> AsyncIterator[str]:
+        """Выполняет потоковый запрос к API и отдает части ответа."""
@@ -4,13 +4,17 @@
 """
 
 import openai
-from typing import List, Dict
+from typing import Iterator, List, Dict, Optional
 import logging
 
+from utils.response_cache import ResponseCache
+
+from .base_client import BaseLLMClient
+
 logger = logging.getLogger(__name__)
 
 
-class OpenAIClient:
+class OpenAIClient(BaseLLMClient):
     """Клиент для OpenAI API."""
     
     def __init__(
@@ -18,7 +22,8 @@ class OpenAIClient:
         api_key: str,
         model: str = "gpt-4o-mini",
         temperature: float = 0.7,
-        max_tokens: int = 1000
+        max_tokens: int = 1000,
+        cache: Optional[ResponseCache] = None
     ):
         """
         Инициализирует OpenAI клиент.
@@ -28,80 +33,64 @@ class OpenAIClient:
             model: Модель для использования
             temperature: Температура генерации
             max_tokens: Максимальное количество токенов
+            cache: Кеш ответов (опционально)
         """
+        super().__init__(model, temperature, max_tokens, cache)
         openai.api_key = api_key
         self.client = openai
-        self.model = model
-        self.temperature = temperature
-        self.max_tokens = max_tokens
         
         logger.info(f"OpenAI клиент инициализирован: модель={model}")
     
-    def generate_response(
+    def _complete(
         self,
         messages: List[Dict[str, str]],
-        temperature: float = None,
-        max_tokens: int = None
+        temperature: float,
+        max_tokens: int
     ) -> str:
         """
-        Генерирует ответ с помощью GPT.
+        Выполняет запрос к Chat Completions API.
         
         Args:
             messages: Список сообщений для GPT
-            temperature: Температура (опционально)
-            max_tokens: Макс токены (опционально)
+            temperature: Температура
+            max_tokens: Макс токены
             
         Returns:
-            Сгенерированный ответ
+            Текст ответа
         """
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature or self.temperature,
-                max_tokens=max_tokens or self.max_tokens
-            )
-            
-            answer = response.choices[0].message.content
-            logger.info(f"Ответ сгенерирован: {len(answer)} символов")
-            
-            return answer
-        
-        except Exception as e:
-            logger.error(f"Ошибка генерации ответа: {e}")
-            raise
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        return response.choices[0].message.content
     
-    def generate_streaming_response(
+    def _stream(
         self,
         messages: List[Dict[str, str]],
-        temperature: float = None,
-        max_tokens: int = None
-    ):
+        temperature: float,
+        max_tokens: int
+    ) -> Iterator[str]:
         """
-        Генерирует ответ с потоковой передачей.
+        Выполняет потоковый запрос к Chat Completions API.
         
         Args:
             messages: Список сообщений для GPT
-            temperature: Температура (опционально)
-            max_tokens: Макс токены (опционально)
+            temperature: Температура
+            max_tokens: Макс токены
             
         Yields:
             Части ответа
         """
-        try:
-            stream = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature or self.temperature,
-                max_tokens=max_tokens or self.max_tokens,
-                stream=True
-            )
-            
-            for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    yield chunk.choices[0].delta.content
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
         
-        except Exception as e:
-            logger.error(f"Ошибка streaming генерации: {e}")
-            raise
-
+        for chunk in stream:
+            if chunk.choices[0].delta.content is not None:
+                yield chunk.choices[0].delta.content
@@ -4,6 +4,7 @@
 """
 
 from typing import List, Dict
+import asyncio
 import logging
 
 from .openai_client import OpenAIClient
@@ -113,6 +114,28 @@ class ResponseGenerator:
             logger.error(f"Ошибка генерации ответа: {e}")
             return f"Извините, произошла ошибка при генерации ответа: {str(e)}"
     
+    async def agenerate(
+        self,
+        query: str,
+        context_documents: List[Dict],
+        conversation_history: List[Dict] = None
+    ) -> str:
+        """
+        Асинхронно генерирует ответ, не блокируя event loop.
+        
+        Args:
+            query: Вопрос пользователя
+            context_documents: Документы из базы знаний
+            conversation_history: История диалога (опционально)
+            
+        Returns:
+            Сгенерированный ответ
+        """
+        # Клиент OpenAI синхронный, выполняем его в отдельном потоке
+        return await asyncio.to_thread(
+            self.generate, query, context_documents, conversation_history
+        )
+    
     def format_response_with_sources(
         self,
         answer: str,
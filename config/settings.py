@@ -5,11 +5,21 @@
 
 import os
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional
-from dotenv import load_dotenv
 
-# Загружаем переменные окружения
-load_dotenv()
+
+@lru_cache(maxsize=None)
+def load_env_file() -> bool:
+    """
+    Загружает переменные окружения из .env (один раз за процесс).
+    
+    Returns:
+        True если файл .env найден и загружен
+    """
+    from dotenv import load_dotenv
+    
+    return load_dotenv()
 
 
 @dataclass
@@ -26,6 +36,7 @@ class Settings:
     openai_api_key: Optional[str] = None
     openai_model: str = "gpt-4o-mini"
     openai_embedding_model: str = "text-embedding-3-small"
+    openai_embedding_dimensions: Optional[int] = None
     openai_temperature: float = 0.7
     openai_max_tokens: int = 1000
     
@@ -39,11 +50,13 @@ class Settings:
     # ChromaDB
     chroma_persist_dir: str = "./chroma_db"
     chroma_collection: str = "documents"
+    embedding_cache_path: str = "./embedding_cache.db"
     
     # RAG параметры
     rag_n_results: int = 5
     chunk_size: int = 500
     chunk_overlap: int = 100
+    rag_max_context_tokens: int = 3000
     
     # Session управление
     session_timeout: int = 3600  # 1 час в секундах
@@ -60,8 +73,12 @@ class Settings:
         Raises:
             ValueError: Если обязательные переменные не установлены
         """
-        telegram_token = os.getenv("TELEGRAM_BOT_TOKEN")
-        ai_provider = os.getenv("AI_PROVIDER", "openai").lower()
+        # .env читается при первом обращении, а не при импорте модуля
+        load_env_file()
+        env = os.environ
+        
+        telegram_token = env.get("TELEGRAM_BOT_TOKEN")
+        ai_provider = env.get("AI_PROVIDER", "openai").lower()
         
         if not telegram_token:
             raise ValueError(
@@ -71,7 +88,7 @@ class Settings:
         
         # Проверяем наличие ключа для выбранного провайдера
         if ai_provider == "openai":
-            openai_api_key = os.getenv("OPENAI_API_KEY")
+            openai_api_key = env.get("OPENAI_API_KEY")
             if not openai_api_key:
                 raise ValueError(
                     "OPENAI_API_KEY не установлен. "
@@ -79,13 +96,13 @@ class Settings:
                 )
             gigachat_key = None
         elif ai_provider == "gigachat":
-            gigachat_key = os.getenv("GIGACHAT_AUTHORIZATION_KEY")
+            gigachat_key = env.get("GIGACHAT_AUTHORIZATION_KEY")
             if not gigachat_key:
                 raise ValueError(
                     "GIGACHAT_AUTHORIZATION_KEY не установлен. "
                     "Установите переменную окружения или создайте .env файл."
                 )
-            openai_api_key = os.getenv("OPENAI_API_KEY")  # Все равно нужен для embeddings
+            openai_api_key = env.get("OPENAI_API_KEY")  # Все равно нужен для embeddings
             if not openai_api_key:
                 raise ValueError(
                     "OPENAI_API_KEY все еще нужен для генерации embeddings. "
@@ -101,17 +118,21 @@ class Settings:
             telegram_token=telegram_token,
             ai_provider=ai_provider,
             openai_api_key=openai_api_key,
-            openai_model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            openai_embedding_model=os.getenv(
+            openai_model=env.get("OPENAI_MODEL", "gpt-4o-mini"),
+            openai_embedding_model=env.get(
                 "OPENAI_EMBEDDING_MODEL", 
                 "text-embedding-3-small"
             ),
+            openai_embedding_dimensions=(
+                int(env["OPENAI_EMBEDDING_DIMENSIONS"])
+                if env.get("OPENAI_EMBEDDING_DIMENSIONS") else None
+            ),
             gigachat_authorization_key=gigachat_key,
-            gigachat_model=os.getenv("GIGACHAT_MODEL", "GigaChat"),
-            gigachat_temperature=float(os.getenv("GIGACHAT_TEMPERATURE", "0.7")),
-            gigachat_max_tokens=int(os.getenv("GIGACHAT_MAX_TOKENS", "1000")),
-            chroma_persist_dir=os.getenv("CHROMA_PERSIST_DIR", "./chroma_db"),
-            chroma_collection=os.getenv("CHROMA_COLLECTION", "documents"),
+            gigachat_model=env.get("GIGACHAT_MODEL", "GigaChat"),
+            gigachat_temperature=float(env.get("GIGACHAT_TEMPERATURE", "0.7")),
+            gigachat_max_tokens=int(env.get("GIGACHAT_MAX_TOKENS", "1000")),
+            chroma_persist_dir=env.get("CHROMA_PERSIST_DIR", "./chroma_db"),
+            chroma_collection=env.get("CHROMA_COLLECTION", "documents"),
         )
     
     def validate(self) -> bool:
@@ -3,11 +3,16 @@
 Управляет состоянием диалогов и контекстом пользователей.
 """
 
-from typing import Dict, Optional
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+from datetime import datetime
 import logging
-import json
 import os
+import queue
+import threading
+import time
+
+import orjson
 
 from .user_context import UserContext
 
@@ -17,20 +22,89 @@ logger = logging.getLogger(__name__)
 class SessionManager:
     """Менеджер сессий пользователей."""
     
-    def __init__(self, session_timeout: int = 3600, persist_file: str = "sessions.json"):
+    # Число слотов колеса таймеров (степень двойки) и длительность слота в секундах
+    WHEEL_SIZE = 1024
+    WHEEL_TICK = 1.0
+    
+    def __init__(
+        self,
+        session_timeout: int = 3600,
+        persist_dir: str = "sessions",
+        max_sessions: int = 10_000,
+        sweep_interval: float = 900.0,
+        save_delay: float = 0.5,
+        legacy_json_path: Optional[str] = None
+    ):
         """
         Инициализирует менеджер сессий.
         
         Args:
             session_timeout: Таймаут сессии в секундах (по умолчанию 1 час)
-            persist_file: Файл для сохранения сессий
+            persist_dir: Каталог для сохранения сессий (файл на пользователя)
+            max_sessions: Максимальное число сессий в памяти; при превышении
+                вытесняются давно не использовавшиеся
+            sweep_interval: Интервал фоновой очистки истекших сессий в секундах
+            save_delay: Задержка фоновой записи в секундах; запросы на
+                сохранение за это время объединяются в одну запись
+            legacy_json_path: JSON-файл прежнего формата (все сессии в одном
+                файле); если сохраненных сессий нет, они импортируются один раз
         """
-        self.sessions: Dict[str, UserContext] = {}
+        # Порядок ключей - от давно использованных к недавним (LRU)
+        self.sessions: "OrderedDict[str, UserContext]" = OrderedDict()
         self.session_timeout = session_timeout
-        self.persist_file = persist_file
+        self.persist_dir = persist_dir
+        self.max_sessions = max_sessions
+        
+        # Колесо таймеров истечения сессий: слот = тик истечения по модулю
+        # WHEEL_SIZE. Постановка и снятие - O(1), очистка просматривает
+        # только слоты, наступившие с прошлой очистки. Активность пользователя
+        # колесо не трогает: сессия перепланируется, когда ее слот наступит
+        self._wheel: List[Set[str]] = [set() for _ in range(self.WHEEL_SIZE)]
+        self._scheduled_expiry: Dict[str, int] = {}
+        self._current_tick = self._to_tick(time.monotonic())
+        
+        # Истекшие сессии удаляются при обращении к ним и фоновой очисткой;
+        # счетчик позволяет получать статистику без обхода сессий
+        self.expired_count = 0
+        self.sweep_interval = sweep_interval
+        
+        # Общая блокировка защищает словарь сессий и очередь истечения;
+        # блокировки пользователей сериализуют параллельные сообщения
+        # одного пользователя, не задерживая остальных
+        self._lock = threading.RLock()
+        self._user_locks: Dict[str, threading.Lock] = {}
+        
+        # Записываются только измененные сессии, а файлы удаленных - стираются
+        self._dirty_users: Set[str] = set()
+        self._removed_users: Set[str] = set()
         
         # Загружаем сохраненные сессии
         self._load_sessions()
+        if not self.sessions and legacy_json_path:
+            self._import_json(legacy_json_path)
+        
+        self._stop_event = threading.Event()
+        self._sweeper = threading.Thread(
+            target=self._sweep_loop,
+            name="session-sweeper",
+            daemon=True
+        )
+        self._sweeper.start()
+        
+        # Сохранение выполняет фоновый поток: save() лишь ставит отметку
+        # в очередь из одного элемента, поэтому серия сообщений приводит
+        # к одной записи файла и не блокирует event loop
+        self.save_delay = save_delay
+        self._save_queue: "queue.Queue[None]" = queue.Queue(maxsize=1)
+        self._writer = threading.Thread(
+            target=self._writer_loop,
+            name="session-writer",
+            daemon=True
+        )
+        self._writer.start()
+        # Импортированные сессии сразу записываются в файлы нового формата
+        if self._dirty_users:
+            self._request_save()
         
         logger.info(f"SessionManager инициализирован (timeout={session_timeout}s)")
     
@@ -44,24 +118,39 @@ class SessionManager:
         Returns:
             Контекст пользователя
         """
-        user_id = str(user_id)
+        if not isinstance(user_id, str):
+            user_id = str(user_id)
         
-        # Проверяем существующую сессию
-        if user_id in self.sessions:
-            session = self.sessions[user_id]
-            
-            # Проверяем, не истекла ли сессия
-            if not session.is_expired(self.session_timeout):
-                session.update_last_activity()
-                return session
-            else:
-                logger.info(f"Сессия пользователя {user_id} истекла, создаем новую")
-                # Сессия истекла, создаем новую
-                del self.sessions[user_id]
+        with self._lock:
+            user_lock = self._user_locks.setdefault(user_id, threading.Lock())
         
-        # Создаем новую сессию
-        session = UserContext(user_id)
-        self.sessions[user_id] = session
+        # Проверка и создание атомарны для пользователя: два параллельных
+        # сообщения не создадут две разные сессии
+        with user_lock:
+            # Проверяем существующую сессию
+            session = self.sessions.get(user_id)
+            if session is not None:
+                # Проверяем, не истекла ли сессия
+                if not session.is_expired(self.session_timeout):
+                    session.update_last_activity()
+                    with self._lock:
+                        if user_id in self.sessions:
+                            self.sessions.move_to_end(user_id)
+                        self._dirty_users.add(user_id)
+                    return session
+                
+                logger.info(f"Сессия пользователя {user_id} истекла, создаем новую")
+                with self._lock:
+                    self.expired_count += 1
+            
+            # Создаем новую сессию
+            session = UserContext(user_id)
+            with self._lock:
+                self.sessions[user_id] = session
+                self.sessions.move_to_end(user_id)
+                self._schedule_expiry(user_id, session)
+                self._dirty_users.add(user_id)
+                self._evict_overflow()
         
         logger.info(f"Создана новая сессия для пользователя {user_id}")
         
@@ -77,8 +166,22 @@ class SessionManager:
         Returns:
             Контекст пользователя или None
         """
-        user_id = str(user_id)
-        return self.sessions.get(user_id)
+        if not isinstance(user_id, str):
+            user_id = str(user_id)
+        session = self.sessions.get(user_id)
+        if session is None or not session.is_expired(self.session_timeout):
+            return session
+        
+        # Истекшая сессия удаляется сразу, не дожидаясь фоновой очистки
+        with self._lock:
+            if self.sessions.get(user_id) is session:
+                del self.sessions[user_id]
+                self._unschedule_expiry(user_id)
+                self._user_locks.pop(user_id, None)
+                self._removed_users.add(user_id)
+                self.expired_count += 1
+                logger.info(f"Удалена истекшая сессия: {user_id}")
+        return None
     
     def delete_session(self, user_id: str):
         """
@@ -87,84 +190,379 @@ class SessionManager:
         Args:
             user_id: ID пользователя
         """
-        user_id = str(user_id)
-        if user_id in self.sessions:
-            del self.sessions[user_id]
-            logger.info(f"Сессия пользователя {user_id} удалена")
+        if not isinstance(user_id, str):
+            user_id = str(user_id)
+        with self._lock:
+            if user_id in self.sessions:
+                del self.sessions[user_id]
+                self._unschedule_expiry(user_id)
+                self._removed_users.add(user_id)
+                logger.info(f"Сессия пользователя {user_id} удалена")
     
-    def cleanup_expired_sessions(self):
-        """Удаляет истекшие сессии."""
-        expired = []
+    def _evict_overflow(self):
+        """Вытесняет давно не использовавшиеся сессии сверх max_sessions."""
+        while len(self.sessions) > self.max_sessions:
+            user_id, _ = self.sessions.popitem(last=False)
+            self._unschedule_expiry(user_id)
+            self._user_locks.pop(user_id, None)
+            self._removed_users.add(user_id)
+            logger.info(f"Сессия пользователя {user_id} вытеснена (лимит {self.max_sessions})")
+    
+    def _to_tick(self, moment: float) -> int:
+        """Переводит время по time.monotonic() в номер тика колеса."""
+        return int(moment // self.WHEEL_TICK)
+    
+    def _schedule_expiry(self, user_id: str, session: UserContext):
+        """
+        Ставит сессию в колесо таймеров истечения.
         
-        for user_id, session in self.sessions.items():
-            if session.is_expired(self.session_timeout):
-                expired.append(user_id)
+        Args:
+            user_id: ID пользователя
+            session: Контекст пользователя
+        """
+        self._unschedule_expiry(user_id)
+        
+        # Тик округляется вверх и не может оказаться в уже пройденном слоте
+        tick = self._to_tick(session.last_activity + self.session_timeout) + 1
+        tick = max(tick, self._current_tick + 1)
         
-        for user_id in expired:
-            del self.sessions[user_id]
-            logger.info(f"Удалена истекшая сессия: {user_id}")
+        self._scheduled_expiry[user_id] = tick
+        self._wheel[tick & (self.WHEEL_SIZE - 1)].add(user_id)
+    
+    def _unschedule_expiry(self, user_id: str):
+        """
+        Снимает сессию с колеса таймеров.
         
-        if expired:
+        Args:
+            user_id: ID пользователя
+        """
+        tick = self._scheduled_expiry.pop(user_id, None)
+        if tick is not None:
+            self._wheel[tick & (self.WHEEL_SIZE - 1)].discard(user_id)
+    
+    def cleanup_expired_sessions(self):
+        """Удаляет истекшие сессии."""
+        with self._lock:
+            now = time.monotonic()
+            now_tick = self._to_tick(now)
+            if now_tick <= self._current_tick:
+                return
+            
+            # Если прошло больше оборота колеса, каждый слот просматривается один раз
+            first_tick = max(self._current_tick + 1, now_tick - self.WHEEL_SIZE + 1)
+            self._current_tick = now_tick
+            
+            # Запланированных сессий нет - обходить пустые слоты незачем
+            if not self._scheduled_expiry:
+                return
+            
+            # Атрибуты вынесены в локальные имена: цикл может затронуть
+            # тысячи сессий за раз
+            sessions = self.sessions
+            scheduled = self._scheduled_expiry
+            wheel = self._wheel
+            mask = self.WHEEL_SIZE - 1
+            deadline = now - self.session_timeout
+            expired: List[str] = []
+            
+            for tick in range(first_tick, now_tick + 1):
+                slot = wheel[tick & mask]
+                if not slot:
+                    continue
+                
+                for user_id in list(slot):
+                    # Сессия истекает на одном из следующих оборотов колеса
+                    if scheduled[user_id] > now_tick:
+                        continue
+                    
+                    slot.discard(user_id)
+                    del scheduled[user_id]
+                    
+                    session = sessions.get(user_id)
+                    if session is None:
+                        continue
+                    
+                    if session.last_activity < deadline:
+                        del sessions[user_id]
+                        expired.append(user_id)
+                    else:
+                        # Пользователь был активен после постановки в колесо
+                        self._schedule_expiry(user_id, session)
+            
+            if not expired:
+                return
+            
+            # Пишем в журнал только итог: запись на каждую сессию
+            # обходится дороже самой очистки
+            for user_id in expired:
+                self._user_locks.pop(user_id, None)
+            self._removed_users.update(expired)
+            self.expired_count += len(expired)
             logger.info(f"Очищено {len(expired)} истекших сессий")
     
-    def get_active_session_count(self) -> int:
+    def _sweep_loop(self):
+        """Периодически удаляет истекшие сессии в фоновом потоке."""
+        while not self._stop_event.wait(self.sweep_interval):
+            try:
+                self.cleanup_expired_sessions()
+            except Exception as e:
+                logger.error(f"Ошибка фоновой очистки сессий: {e}")
+    
+    def _writer_loop(self):
+        """Записывает сессии в файл по запросам из очереди."""
+        while True:
+            self._save_queue.get()
+            
+            # Запросы, пришедшие за время задержки, попадут в ту же запись
+            self._stop_event.wait(self.save_delay)
+            try:
+                self._save_queue.get_nowait()
+            except queue.Empty:
+                pass
+            
+            self._save_sessions()
+            
+            if self._stop_event.is_set() and self._save_queue.empty():
+                return
+    
+    def close(self):
+        """Останавливает фоновые потоки и дожидается последней записи."""
+        self._stop_event.set()
+        self._request_save()
+        self._writer.join(timeout=10)
+    
+    def get_active_session_count(self, force: bool = False) -> int:
         """
         Получает количество активных сессий.
         
+        Args:
+            force: Очистить истекшие сессии перед подсчетом
+            
         Returns:
             Количество активных сессий
         """
-        # Сначала очищаем истекшие
-        self.cleanup_expired_sessions()
+        if force:
+            self.cleanup_expired_sessions()
         return len(self.sessions)
     
-    def get_all_user_ids(self) -> list:
+    def get_all_user_ids(self, force: bool = False) -> list:
         """
         Получает список всех активных пользователей.
         
+        Args:
+            force: Очистить истекшие сессии перед выборкой
+            
         Returns:
             Список ID пользователей
         """
-        self.cleanup_expired_sessions()
-        return list(self.sessions.keys())
+        if force:
+            self.cleanup_expired_sessions()
+        with self._lock:
+            return list(self.sessions.keys())
+    
+    def _session_path(self, user_id: str) -> str:
+        """Возвращает путь к файлу сессии пользователя."""
+        return os.path.join(self.persist_dir, f"{user_id}.json")
+    
+    @staticmethod
+    def _remove_file(path: str):
+        """Удаляет файл сессии, если он существует."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Ошибка удаления файла сессии {path}: {e}")
     
     def _load_sessions(self):
-        """Загружает сессии из файла."""
-        if not os.path.exists(self.persist_file):
+        """Загружает сессии из каталога."""
+        if not os.path.isdir(self.persist_dir):
             return
         
         try:
-            with open(self.persist_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # Файл сессии записывается после активности пользователя, поэтому
+            # по времени его изменения (scandir отдает его без лишних вызовов)
+            # можно отбросить истекшие сессии и те, что сразу были бы
+            # вытеснены, не читая и не разбирая их
+            deadline = time.time() - self.session_timeout
+            entries_to_load = []
+            stale = 0
+            with os.scandir(self.persist_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.json'):
+                        continue
+                    mtime = entry.stat().st_mtime
+                    if mtime < deadline:
+                        self._remove_file(entry.path)
+                        stale += 1
+                        continue
+                    entries_to_load.append((mtime, entry.name))
             
-            for user_id, session_data in data.items():
-                context = UserContext(user_id)
-                context.conversation_history = session_data.get('conversation_history', [])
-                context.last_activity = datetime.fromisoformat(session_data.get('last_activity'))
+            # Самые свежие сессии, в порядке от давних к недавним (LRU);
+            # остальные были бы вытеснены сразу после загрузки
+            entries_to_load.sort()
+            overflow = len(entries_to_load) - self.max_sessions
+            if overflow > 0:
+                for _, name in entries_to_load[:overflow]:
+                    self._remove_file(os.path.join(self.persist_dir, name))
+                entries_to_load = entries_to_load[overflow:]
+            
+            if stale:
+                logger.info(f"Удалено {stale} файлов истекших сессий")
+            
+            for _, name in entries_to_load:
+                user_id = name[:-len('.json')]
+                # Поврежденный файл пропускается, остальные сессии загружаются
+                try:
+                    with open(os.path.join(self.persist_dir, name), 'rb') as f:
+                        session_data = orjson.loads(f.read())
+                    
+                    context = UserContext(user_id)
+                    context.restore_history(
+                        session_data.get('roles', []),
+                        session_data.get('contents', []),
+                        session_data.get('timestamps', [])
+                    )
+                    # В файле хранится время по системным часам, в памяти - по time.monotonic()
+                    context.restore_last_activity(
+                        datetime.fromisoformat(session_data.get('last_activity'))
+                    )
+                except Exception as e:
+                    logger.error(f"Ошибка загрузки сессии {user_id} из {name}: {e}")
+                    continue
+                
                 self.sessions[user_id] = context
+                self._schedule_expiry(user_id, context)
             
-            logger.info(f"Загружено {len(self.sessions)} сессий из {self.persist_file}")
+            self._evict_overflow()
+            
+            logger.info(f"Загружено {len(self.sessions)} сессий из {self.persist_dir}")
         except Exception as e:
             logger.error(f"Ошибка загрузки сессий: {e}")
     
-    def _save_sessions(self):
-        """Сохраняет сессии в файл."""
+    def _import_json(self, json_path: str):
+        """
+        Импортирует сессии из JSON-файла прежнего формата.
+        
+        Args:
+            json_path: Путь к JSON-файлу
+        """
+        if not os.path.exists(json_path):
+            return
+        
         try:
-            data = {}
-            for user_id, session in self.sessions.items():
-                data[user_id] = {
-                    'conversation_history': session.conversation_history,
-                    'last_activity': session.last_activity.isoformat()
-                }
-            
-            with open(self.persist_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
-            logger.debug(f"Сохранено {len(self.sessions)} сессий в {self.persist_file}")
+            with open(json_path, 'rb') as f:
+                data = orjson.loads(f.read())
         except Exception as e:
+            logger.error(f"Ошибка импорта сессий из {json_path}: {e}")
+            return
+        
+        now = time.monotonic()
+        imported = []
+        for user_id, session_data in data.items():
+            try:
+                history = session_data.get('conversation_history', [])
+                context = UserContext(user_id)
+                context.restore_history(
+                    [message['role'] for message in history],
+                    [message['content'] for message in history],
+                    [datetime.fromisoformat(message['timestamp']).timestamp() for message in history]
+                )
+                context.restore_last_activity(
+                    datetime.fromisoformat(session_data.get('last_activity'))
+                )
+            except Exception as e:
+                logger.error(f"Ошибка импорта сессии {user_id} из {json_path}: {e}")
+                continue
+            
+            if not context.is_expired(self.session_timeout, now):
+                imported.append((context.last_activity, user_id, context))
+        
+        # От давних к недавним (LRU), как при загрузке из каталога
+        imported.sort(key=lambda item: item[0])
+        for _, user_id, context in imported:
+            self.sessions[user_id] = context
+            self._schedule_expiry(user_id, context)
+            self._dirty_users.add(user_id)
+        
+        self._evict_overflow()
+        
+        logger.info(
+            f"Импортировано сессий из {json_path}: {len(self.sessions)} "
+            f"(истекшие пропущены); далее сессии хранятся в {self.persist_dir}"
+        )
+    
+    def _save_sessions(self):
+        """Сохраняет измененные сессии и удаляет файлы удаленных."""
+        with self._lock:
+            dirty, self._dirty_users = self._dirty_users, set()
+            removed, self._removed_users = self._removed_users, set()
+            sessions = [
+                (user_id, self.sessions[user_id])
+                for user_id in dirty
+                if user_id in self.sessions
+            ]
+            removed = [user_id for user_id in removed if user_id not in self.sessions]
+        
+        if not sessions and not removed:
+            return
+        
+        try:
+            os.makedirs(self.persist_dir, exist_ok=True)
+        except OSError as e:
             logger.error(f"Ошибка сохранения сессий: {e}")
+            return
+        
+        for user_id, session in sessions:
+            try:
+                # Снимок под блокировкой сессии: столбцы не расходятся,
+                # даже если сообщение добавляется во время записи
+                roles, contents, timestamps = session.snapshot_history()
+                data = {
+                    # История пишется столбцами, как хранится в UserContext
+                    'roles': roles,
+                    'contents': contents,
+                    'timestamps': timestamps,
+                    # orjson сериализует datetime в ISO 8601 сам
+                    'last_activity': session.get_last_activity_datetime()
+                }
+                
+                # Запись во временный файл и замена: файл сессии не бывает записан наполовину
+                path = self._session_path(user_id)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(orjson.dumps(data))
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logger.error(f"Ошибка сохранения сессии {user_id}: {e}")
+        
+        for user_id in removed:
+            self._remove_file(self._session_path(user_id))
+        
+        logger.debug(
+            f"Сохранено {len(sessions)} сессий, удалено {len(removed)} в {self.persist_dir}"
+        )
     
-    def save(self):
-        """Публичный метод для сохранения сессий."""
-        self._save_sessions()
-
+    def save(self, user_id: Optional[str] = None):
+        """
+        Запрашивает фоновое сохранение сессий, не дожидаясь записи.
+        
+        Args:
+            user_id: ID пользователя, чья сессия изменилась; без него
+                сохраняются все сессии
+        """
+        with self._lock:
+            if user_id is None:
+                self._dirty_users.update(self.sessions)
+            else:
+                self._dirty_users.add(user_id if isinstance(user_id, str) else str(user_id))
+        
+        self._request_save()
+    
+    def _request_save(self):
+        """Будит фоновый поток записи."""
+        try:
+            self._save_queue.put_nowait(None)
+        except queue.Full:
+            # Запись уже запланирована и сохранит актуальное состояние
+            pass
@@ -3,29 +3,84 @@
 Хранит информацию о текущем диалоге и состоянии пользователя.
 """
 
+from collections import deque
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from itertools import islice
+from typing import Deque, Iterable, List, Dict, Any, Optional, Tuple
 import logging
+import sys
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Роли сообщений: все сообщения ссылаются на один объект строки,
+# в том числе загруженные из файла сессии
+_USER = sys.intern("user")
+_ASSISTANT = sys.intern("assistant")
+_ROLES = {_USER: _USER, _ASSISTANT: _ASSISTANT}
+
+
+def _window(column: Deque, start: int, end: int) -> Iterable:
+    """
+    Возвращает элементы column[start:end] по порядку.
+    
+    Окно у конца буфера (обычный случай - последние сообщения) читается
+    с хвоста, чтобы не проходить всю историю от начала.
+    """
+    skip_tail = len(column) - end
+    if start <= skip_tail:
+        return islice(column, start, end)
+    
+    window = list(islice(reversed(column), skip_tail, len(column) - start))
+    window.reverse()
+    return window
+
 
 class UserContext:
     """Контекст диалога пользователя."""
     
-    def __init__(self, user_id: str):
+    # Без __dict__ у экземпляров: сессий в памяти могут быть тысячи
+    __slots__ = (
+        "user_id",
+        "created_at",
+        "last_activity",
+        "max_history",
+        "roles",
+        "contents",
+        "timestamps",
+        "metadata",
+        "state",
+        "message_count",
+        "_history_lock",
+    )
+    
+    def __init__(self, user_id: str, max_history: int = 200):
         """
         Инициализирует контекст пользователя.
         
         Args:
             user_id: ID пользователя
+            max_history: Максимальное число хранимых сообщений; старые
+                вытесняются при добавлении новых
         """
-        self.user_id = str(user_id)
-        self.created_at = datetime.now()
-        self.last_activity = datetime.now()
+        self.user_id = user_id if isinstance(user_id, str) else str(user_id)
+        # Время по time.monotonic(): не зависит от перевода системных часов,
+        # а проверка истечения сводится к вычитанию чисел
+        self.created_at = time.monotonic()
+        self.last_activity = self.created_at
         
-        # История сообщений (для контекста ИИ)
-        self.conversation_history: List[Dict[str, str]] = []
+        # История сообщений (для контекста ИИ) хранится по столбцам:
+        # сообщение - это элементы с одним индексом в трех кольцевых буферах
+        self.max_history = max_history
+        self.roles: Deque[str] = deque(maxlen=max_history)
+        self.contents: Deque[str] = deque(maxlen=max_history)
+        # Время сообщений - секунды эпохи (time.time()); в ISO 8601
+        # переводится только при выдаче истории с timestamps
+        self.timestamps: Deque[float] = deque(maxlen=max_history)
+        # Поток записи сессий читает столбцы параллельно с обработкой
+        # сообщений: изменение и снимок истории выполняются под блокировкой
+        self._history_lock = threading.Lock()
         
         # Метаданные пользователя
         self.metadata: Dict[str, Any] = {}
@@ -46,11 +101,10 @@ class UserContext:
             role: Роль отправителя ('user' или 'assistant')
             content: Содержимое сообщения
         """
-        self.conversation_history.append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat()
-        })
+        with self._history_lock:
+            self.roles.append(_ROLES.get(role) or sys.intern(role))
+            self.contents.append(content)
+            self.timestamps.append(time.time())
         
         self.message_count += 1
         self.update_last_activity()
@@ -63,7 +117,8 @@ class UserContext:
     def get_conversation_history(
         self,
         max_messages: int = None,
-        include_timestamps: bool = False
+        include_timestamps: bool = False,
+        exclude_last: bool = False
     ) -> List[Dict[str, str]]:
         """
         Получает историю диалога.
@@ -71,46 +126,122 @@ class UserContext:
         Args:
             max_messages: Максимальное количество последних сообщений
             include_timestamps: Включать ли timestamps в результат
+            exclude_last: Не включать последнее сообщение (обычно текущий
+                вопрос); max_messages считается до его исключения
             
         Returns:
             История сообщений
         """
-        history = self.conversation_history
+        total = len(self.roles)
         
-        # Ограничиваем количество сообщений
-        if max_messages:
-            history = history[-max_messages:]
+        # Окно последних сообщений
+        start = max(total - max_messages, 0) if max_messages else 0
+        end = max(total - 1, 0) if exclude_last else total
         
-        # Убираем timestamps если не нужны
-        if not include_timestamps:
-            history = [
-                {"role": msg["role"], "content": msg["content"]}
-                for msg in history
+        roles = _window(self.roles, start, end)
+        contents = _window(self.contents, start, end)
+        
+        if include_timestamps:
+            timestamps = _window(self.timestamps, start, end)
+            return [
+                {
+                    "role": role,
+                    "content": content,
+                    "timestamp": datetime.fromtimestamp(timestamp).isoformat()
+                }
+                for role, content, timestamp in zip(roles, contents, timestamps)
             ]
         
-        return history
+        return [
+            {"role": role, "content": content}
+            for role, content in zip(roles, contents)
+        ]
+    
+    def restore_history(
+        self,
+        roles: Iterable[str],
+        contents: Iterable[str],
+        timestamps: Iterable[float]
+    ):
+        """
+        Восстанавливает историю диалога из сохраненных столбцов.
+        
+        Args:
+            roles: Роли сообщений
+            contents: Содержимое сообщений
+            timestamps: Время сообщений (секунды эпохи)
+        """
+        roles = deque(
+            (_ROLES.get(role) or sys.intern(role) for role in roles),
+            maxlen=self.max_history
+        )
+        contents = deque(contents, maxlen=self.max_history)
+        timestamps = deque(timestamps, maxlen=self.max_history)
+        with self._history_lock:
+            self.roles, self.contents, self.timestamps = roles, contents, timestamps
+    
+    def snapshot_history(self) -> Tuple[List[str], List[str], List[float]]:
+        """
+        Копирует столбцы истории согласованно между собой.
+        
+        Безопасно вызывать из другого потока, пока сообщения добавляются.
+        
+        Returns:
+            Кортеж (роли, содержимое, время сообщений)
+        """
+        with self._history_lock:
+            return list(self.roles), list(self.contents), list(self.timestamps)
+    
+    @property
+    def conversation_history(self) -> List[Dict[str, str]]:
+        """Полная история диалога с timestamps."""
+        return self.get_conversation_history(include_timestamps=True)
     
     def clear_conversation_history(self):
         """Очищает историю диалога."""
-        self.conversation_history = []
+        with self._history_lock:
+            self.roles.clear()
+            self.contents.clear()
+            self.timestamps.clear()
         logger.info(f"История диалога очищена для {self.user_id}")
     
     def update_last_activity(self):
         """Обновляет время последней активности."""
-        self.last_activity = datetime.now()
+        self.last_activity = time.monotonic()
+    
+    def get_last_activity_datetime(self) -> datetime:
+        """
+        Получает время последней активности по системным часам.
+        
+        Returns:
+            Время последней активности
+        """
+        return datetime.now() - self.get_idle_time()
+    
+    def restore_last_activity(self, moment: datetime):
+        """
+        Восстанавливает время последней активности из сохраненного значения.
+        
+        Args:
+            moment: Время последней активности по системным часам
+        """
+        self.last_activity = time.monotonic() - (datetime.now() - moment).total_seconds()
     
-    def is_expired(self, timeout_seconds: int) -> bool:
+    def is_expired(self, timeout_seconds: int, now: Optional[float] = None) -> bool:
         """
         Проверяет, истекла ли сессия.
         
         Args:
             timeout_seconds: Таймаут в секундах
+            now: Текущее время по time.monotonic() (опционально, чтобы
+                при проверке многих сессий не запрашивать время каждый раз)
             
         Returns:
             True если сессия истекла
         """
-        timeout_delta = timedelta(seconds=timeout_seconds)
-        return datetime.now() - self.last_activity > timeout_delta
+        if now is None:
+            now = time.monotonic()
+        return now - self.last_activity > timeout_seconds
     
     def get_metadata(self, key: str, default: Any = None) -> Any:
         """
@@ -143,7 +274,7 @@ class UserContext:
         Returns:
             Продолжительность сессии
         """
-        return datetime.now() - self.created_at
+        return timedelta(seconds=time.monotonic() - self.created_at)
     
     def get_idle_time(self) -> timedelta:
         """
@@ -152,7 +283,7 @@ class UserContext:
         Returns:
             Время простоя
         """
-        return datetime.now() - self.last_activity
+        return timedelta(seconds=time.monotonic() - self.last_activity)
     
     def to_dict(self) -> Dict:
         """
@@ -163,10 +294,10 @@ class UserContext:
         """
         return {
             "user_id": self.user_id,
-            "created_at": self.created_at.isoformat(),
-            "last_activity": self.last_activity.isoformat(),
+            "created_at": (datetime.now() - self.get_session_duration()).isoformat(),
+            "last_activity": self.get_last_activity_datetime().isoformat(),
             "message_count": self.message_count,
-            "conversation_length": len(self.conversation_history),
+            "conversation_length": len(self.roles),
             "state": self.state,
             "metadata": self.metadata
         }
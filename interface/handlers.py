@@ -5,10 +5,49 @@
 
 from telegram import Update
 from telegram.ext import ContextTypes
+import asyncio
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Тексты команд /start и /help не меняются и создаются один раз при импорте
+_WELCOME = """👋 Привет! Я AI ассистент с доступом к базе знаний.
+
+Я могу ответить на ваши вопросы, используя информацию из внутренних документов.
+
+📝 Просто отправьте мне свой вопрос, и я постараюсь помочь!
+
+Команды:
+/help - справка
+/stats - статистика базы знаний
+/clear - очистить историю диалога
+
+Пример вопроса: "Какая корпоративная культура в компании?"
+"""
+
+_HELP = """📖 Справка по использованию бота:
+
+🔹 Как задать вопрос:
+Просто напишите свой вопрос обычным текстом. Например:
+- "Какие инструменты использует команда разработки?"
+- "Расскажи про политику удаленной работы"
+- "Что такое корпоративная культура компании?"
+
+🔹 Доступные команды:
+/start - приветствие
+/help - эта справка
+/stats - статистика базы знаний
+/clear - очистить историю диалога
+
+🔹 Как работает бот:
+1. Я ищу релевантную информацию в базе знаний
+2. Использую найденную информацию для формирования ответа
+3. Отвечаю на основе реальных документов компании
+
+❗ Важно: Я отвечаю только на основе информации из базы знаний. Если нужной информации нет, я честно об этом сообщу.
+"""
+
 
 class BotHandlers:
     """Обработчики команд и сообщений бота."""
@@ -37,6 +76,12 @@ class BotHandlers:
         self.user_db = user_db
         self.vector_db = vector_db
         
+        # Обновления базы пользователей выполняются в потоках параллельно
+        # с обработкой сообщений; блокировка сохраняет их последовательность
+        self._user_db_lock = threading.Lock()
+        # Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора
+        self._background_tasks = set()
+        
         logger.info("BotHandlers инициализированы")
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -45,52 +90,19 @@ class BotHandlers:
         user_name = update.effective_user.first_name
         
         # Создаем/обновляем пользователя в БД
-        self.user_db.create_or_update_user(user_id, name=user_name)
+        with self._user_db_lock:
+            self.user_db.create_or_update_user(user_id, name=user_name)
         
         # Создаем сессию
         session = self.session_manager.get_or_create_session(user_id)
         
-        welcome_message = """👋 Привет! Я AI ассистент с доступом к базе знаний.
-
-Я могу ответить на ваши вопросы, используя информацию из внутренних документов.
-
-📝 Просто отправьте мне свой вопрос, и я постараюсь помочь!
-
-Команды:
-/help - справка
-/stats - статистика базы знаний
-/clear - очистить историю диалога
-
-Пример вопроса: "Какая корпоративная культура в компании?"
-"""
-        await update.message.reply_text(welcome_message)
+        await update.message.reply_text(_WELCOME)
         
         logger.info(f"Пользователь {user_id} ({user_name}) начал работу с ботом")
     
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /help"""
-        help_message = """📖 Справка по использованию бота:
-
-🔹 Как задать вопрос:
-Просто напишите свой вопрос обычным текстом. Например:
-- "Какие инструменты использует команда разработки?"
-- "Расскажи про политику удаленной работы"
-- "Что такое корпоративная культура компании?"
-
-🔹 Доступные команды:
-/start - приветствие
-/help - эта справка
-/stats - статистика базы знаний
-/clear - очистить историю диалога
-
-🔹 Как работает бот:
-1. Я ищу релевантную информацию в базе знаний
-2. Использую найденную информацию для формирования ответа
-3. Отвечаю на основе реальных документов компании
-
-❗ Важно: Я отвечаю только на основе информации из базы знаний. Если нужной информации нет, я честно об этом сообщу.
-"""
-        await update.message.reply_text(help_message)
+        await update.message.reply_text(_HELP)
     
     async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /stats"""
@@ -125,58 +137,87 @@ class BotHandlers:
     async def clear_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /clear - очистка истории диалога"""
         user_id = update.effective_user.id
+        # Строковый ключ сессии вычисляется один раз на обработку
+        session_key = str(user_id)
         
-        session = self.session_manager.get_session(user_id)
+        session = self.session_manager.get_session(session_key)
         if session:
             session.clear_conversation_history()
-            self.session_manager.save()
+            self.session_manager.save(session_key)
             await update.message.reply_text("✅ История диалога очищена!")
         else:
             await update.message.reply_text("ℹ️ История диалога пуста.")
         
         logger.info(f"Пользователь {user_id} очистил историю")
     
+    def _update_user_stats(self, user_id: int, user_name: str):
+        """
+        Обновляет пользователя и счетчик его сообщений в БД.
+        
+        Args:
+            user_id: ID пользователя
+            user_name: Имя пользователя
+        """
+        try:
+            with self._user_db_lock:
+                self.user_db.touch(user_id, name=user_name)
+        except Exception as e:
+            logger.error(f"Ошибка обновления пользователя {user_id}: {e}")
+    
+    def _run_in_background(self, func, *args):
+        """
+        Запускает блокирующую функцию в потоке, не дожидаясь результата.
+        
+        Args:
+            func: Функция
+            *args: Аргументы функции
+        """
+        task = asyncio.create_task(asyncio.to_thread(func, *args))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик текстовых сообщений (вопросов пользователя)"""
         user_id = update.effective_user.id
         user_name = update.effective_user.first_name
         user_query = update.message.text
+        # Строковый ключ сессии вычисляется один раз на обработку
+        session_key = str(user_id)
         
         logger.info(f"Получен вопрос от {user_name} (ID: {user_id}): {user_query}")
         
-        # Отправляем индикатор "печатает..."
-        await update.message.chat.send_action(action="typing")
+        # 1. Поиск контекста в векторной БД запускается сразу и идет
+        # параллельно с остальной подготовкой
+        logger.info(f"Поиск контекста для запроса: {user_query}")
+        documents_task = asyncio.create_task(self.context_retriever.aretrieve(user_query))
+        
+        # Обновляем пользователя в БД в фоне: ответ от этого не зависит
+        self._run_in_background(self._update_user_stats, user_id, user_name)
         
         try:
-            # Обновляем пользователя в БД
-            self.user_db.create_or_update_user(user_id, name=user_name)
-            self.user_db.increment_message_count(user_id)
+            # Отправляем индикатор "печатает..."
+            await update.message.chat.send_action(action="typing")
             
             # Получаем или создаем сессию
-            session = self.session_manager.get_or_create_session(user_id)
+            session = self.session_manager.get_or_create_session(session_key)
             
             # Добавляем запрос пользователя в историю
             session.add_message("user", user_query)
             
-            # 1. Получаем релевантный контекст из векторной БД
-            logger.info(f"Поиск контекста для запроса: {user_query}")
-            documents = self.context_retriever.retrieve(user_query)
-            
-            logger.info(f"Найдено документов: {len(documents)}")
-            
-            # 2. Получаем историю диалога (без текущего вопроса)
-            conversation_history = session.get_conversation_history(
+            # 2. Получаем историю диалога (без текущего вопроса пользователя)
+            history_for_ai = session.get_conversation_history(
                 max_messages=10,
-                include_timestamps=False
+                include_timestamps=False,
+                exclude_last=True
             )
             
-            # Убираем последнее сообщение (текущий вопрос пользователя)
-            history_for_ai = conversation_history[:-1] if len(conversation_history) > 1 else []
-            
             logger.info(f"История диалога: {len(history_for_ai)} сообщений")
             
-            # 3. Генерируем ответ
-            answer = self.response_generator.generate(
+            documents = await documents_task
+            logger.info(f"Найдено документов: {len(documents)}")
+            
+            # 3. Генерируем ответ (не блокируя обработку других пользователей)
+            answer = await self.response_generator.agenerate(
                 query=user_query,
                 context_documents=documents,
                 conversation_history=history_for_ai if history_for_ai else None
@@ -185,17 +226,18 @@ class BotHandlers:
             # 4. Добавляем ответ в историю
             session.add_message("assistant", answer)
             
-            # Сохраняем сессии
-            self.session_manager.save()
+            # Сохраняем сессию пользователя (запись выполняется в фоновом потоке)
+            self.session_manager.save(session_key)
             
             # 5. Форматируем ответ с источниками
             sources = self.context_retriever.get_sources(documents)
             
             if sources:
-                sources_text = "\n\n📚 Источники:\n" + "\n".join([
-                    f"• {src}" for src in sources
-                ])
-                full_response = answer + sources_text
+                full_response = "".join((
+                    answer,
+                    "\n\n📚 Источники:\n",
+                    "\n".join(f"• {src}" for src in sources)
+                ))
             else:
                 full_response = answer
             
@@ -205,6 +247,8 @@ class BotHandlers:
             logger.info(f"Ответ отправлен пользователю {user_id}")
         
         except Exception as e:
+            if not documents_task.done():
+                documents_task.cancel()
             logger.error(f"Ошибка обработки сообщения: {e}", exc_info=True)
             await update.message.reply_text(
                 "❌ Извините, произошла ошибка при обработке вашего вопроса. Попробуйте еще раз."
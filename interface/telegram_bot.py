@@ -42,6 +42,9 @@ class TelegramBot:
             vector_db: Векторная БД
         """
         self.token = token
+        self.session_manager = session_manager
+        self.response_generator = response_generator
+        self.user_db = user_db
         
         # Инициализируем обработчики
         self.handlers = BotHandlers(
@@ -52,8 +55,16 @@ class TelegramBot:
             vector_db=vector_db
         )
         
-        # Создаем приложение
-        self.application = Application.builder().token(self.token).build()
+        # Создаем приложение; обновления разных пользователей
+        # обрабатываются параллельно в одном event loop. HTTP-клиент
+        # генератора ответов закрывается в том же event loop при остановке
+        self.application = (
+            Application.builder()
+            .token(self.token)
+            .concurrent_updates(True)
+            .post_shutdown(self._post_shutdown)
+            .build()
+        )
         
         # Регистрируем обработчики команд
         self._register_handlers()
@@ -86,6 +97,12 @@ class TelegramBot:
         
         logger.info("Обработчики зарегистрированы")
     
+    async def _post_shutdown(self, application: Application):
+        """Закрывает клиент языковой модели после остановки бота."""
+        aclose = getattr(self.response_generator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    
     def run(self):
         """Запускает бота."""
         logger.info("Запуск Telegram бота...")
@@ -93,4 +110,8 @@ class TelegramBot:
         
         # Запускаем бота
         self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+        
+        # Дожидаемся записи сессий, запрошенной последними сообщениями
+        self.session_manager.close()
+        self.user_db.close()
 
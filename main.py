@@ -11,7 +11,7 @@ from config import Settings
 from storage import VectorDatabase, UserDatabase
 from ai_processor import OpenAIClient
 from ai_processor import ResponseGenerator as OpenAIResponseGenerator
-from ai_gigachat_processor import GigaChatClient
+from ai_gigachat_processor import AsyncGigaChatClient
 from ai_gigachat_processor import ResponseGenerator as GigaChatResponseGenerator
 from memory_manager import PromptBuilder, ContextRetriever
 from dialog_controller import SessionManager
@@ -56,11 +56,16 @@ def initialize_components(settings: Settings):
     vector_db = VectorDatabase(
         persist_directory=settings.chroma_persist_dir,
         collection_name=settings.chroma_collection,
-        openai_api_key=settings.openai_api_key
+        openai_api_key=settings.openai_api_key,
+        embedding_model=settings.openai_embedding_model,
+        embedding_dimensions=settings.openai_embedding_dimensions
     )
     vector_db.get_or_create_collection()
     
-    user_db = UserDatabase(storage_path="./user_data.json")
+    user_db = UserDatabase(
+        storage_path="./user_data.db",
+        legacy_json_path="./user_data.json"
+    )
     
     # 2. AI Processor - Обработка через ИИ
     logger.info(f"Инициализация AI процессора ({settings.ai_provider})...")
@@ -86,7 +91,7 @@ def initialize_components(settings: Settings):
             verify_ssl=settings.gigachat_verify_ssl
         )
         
-        gigachat_client = GigaChatClient(config=gigachat_config)
+        gigachat_client = AsyncGigaChatClient(config=gigachat_config)
         response_generator = GigaChatResponseGenerator(gigachat_client=gigachat_client)
         logger.info(f"✓ GigaChat клиент инициализирован (модель: {settings.gigachat_model})")
         
@@ -96,7 +101,8 @@ def initialize_components(settings: Settings):
     # 3. Memory Manager - Управление памятью
     logger.info("Инициализация менеджера памяти...")
     prompt_builder = PromptBuilder(
-        system_prompt=response_generator.system_prompt
+        system_prompt=response_generator.system_prompt,
+        max_context_tokens=settings.rag_max_context_tokens
     )
     
     context_retriever = ContextRetriever(
@@ -107,7 +113,8 @@ def initialize_components(settings: Settings):
     # 4. Dialog Controller - Управление диалогами
     logger.info("Инициализация контроллера диалогов...")
     session_manager = SessionManager(
-        session_timeout=settings.session_timeout
+        session_timeout=settings.session_timeout,
+        legacy_json_path="./sessions.json"
     )
     
     # 5. Interface - Telegram бот
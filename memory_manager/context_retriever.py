@@ -3,13 +3,17 @@
 Работает с векторной БД для получения релевантного контекста.
 """
 
-from typing import List, Dict
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+import asyncio
+import bisect
+import hashlib
 import logging
+import threading
+import time
 
-import sys
-from pathlib import Path
-# Добавляем родительскую директорию в путь для импортов
-sys.path.insert(0, str(Path(__file__).parent.parent))
+import numpy as np
+import orjson
 
 from storage import VectorDatabase
 
@@ -22,7 +26,12 @@ class ContextRetriever:
     def __init__(
         self,
         vector_db: VectorDatabase,
-        n_results: int = 5
+        n_results: int = 5,
+        cache_size: int = 1024,
+        cache_ttl: float = 3600.0,
+        similarity_threshold: float = 0.9,
+        batch_window: float = 0.005,
+        max_batch_size: int = 32
     ):
         """
         Инициализирует получатель контекста.
@@ -30,17 +39,47 @@ class ContextRetriever:
         Args:
             vector_db: Векторная база данных
             n_results: Количество результатов по умолчанию
+            cache_size: Максимальное количество запросов в кеше (0 - без кеша)
+            cache_ttl: Время жизни записи кеша в секундах
+            similarity_threshold: Минимальная косинусная близость запросов,
+                при которой переиспользуется найденный контекст
+            batch_window: Время в секундах, в течение которого aretrieve
+                собирает одновременные запросы в одну пачку
+            max_batch_size: Максимальное количество запросов в пачке
         """
         self.vector_db = vector_db
         self.n_results = n_results
         
+        # Кеш результатов поиска: сначала точное совпадение нормализованного
+        # запроса, затем поиск близкого запроса по эмбеддингу. Эмбеддинги
+        # лежат в строках одной матрицы, поэтому сравнение со всем кешем -
+        # одно матричное умножение
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.similarity_threshold = similarity_threshold
+        # Ключ -> (строка матрицы, истекает в, параметры поиска, документы)
+        self._cache: "OrderedDict[bytes, Tuple[int, float, bytes, List[Dict]]]" = OrderedDict()
+        self._cache_vecs: Optional[np.ndarray] = None
+        self._free_rows: List[int] = list(range(cache_size))
+        self._row_keys: List[Optional[bytes]] = [None] * cache_size
+        self._cache_lock = threading.Lock()
+        
+        # Очередь aretrieve создается при первом вызове - внутри работающего
+        # event loop
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._batch_queue: Optional[asyncio.Queue] = None
+        self._batch_worker: Optional[asyncio.Task] = None
+        self._batch_tasks = set()
+        
         logger.info("ContextRetriever инициализирован")
     
     def retrieve(
         self,
         query: str,
         n_results: int = None,
-        filter_metadata: Dict = None
+        filter_metadata: Dict = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict]:
         """
         Получает релевантный контекст для запроса.
@@ -49,48 +88,320 @@ class ContextRetriever:
             query: Поисковый запрос
             n_results: Количество результатов (опционально)
             filter_metadata: Фильтр по метаданным
+            query_embedding: Готовый эмбеддинг запроса (опционально)
             
         Returns:
             Список документов с метаданными
         """
         try:
-            # Выполняем поиск в векторной БД
-            results = self.vector_db.search(
-                query=query,
-                n_results=n_results or self.n_results,
-                where=filter_metadata
+            documents = self._retrieve_batch(
+                [query],
+                n_results or self.n_results,
+                filter_metadata,
+                [query_embedding]
+            )[0]
+        except Exception as e:
+            logger.error(f"Ошибка получения контекста: {e}")
+            return []
+        
+        logger.info(f"Найдено {len(documents)} релевантных документов")
+        return documents
+    
+    def retrieve_many(
+        self,
+        queries: List[str],
+        n_results: int = None,
+        filter_metadata: Dict = None
+    ) -> List[List[Dict]]:
+        """
+        Получает контекст сразу для нескольких запросов.
+        
+        Запросы, которых нет в кеше, обрабатываются вместе: один запрос
+        эмбеддингов и один поиск в векторной БД.
+        
+        Args:
+            queries: Поисковые запросы
+            n_results: Количество результатов на запрос (опционально)
+            filter_metadata: Фильтр по метаданным
+            
+        Returns:
+            Списки документов в порядке запросов
+        """
+        try:
+            return self._retrieve_batch(
+                queries,
+                n_results or self.n_results,
+                filter_metadata,
+                [None] * len(queries)
             )
+        except Exception as e:
+            logger.error(f"Ошибка получения контекста: {e}")
+            return [[] for _ in queries]
+    
+    async def aretrieve(self, query: str) -> List[Dict]:
+        """
+        Асинхронно получает контекст для запроса.
+        
+        Запросы, пришедшие одновременно (в пределах batch_window), собираются
+        в пачку и выполняются одним вызовом retrieve_many в отдельном потоке.
+        
+        Args:
+            query: Поисковый запрос
             
-            # Форматируем результаты
-            documents = []
-            if results['documents'] and results['documents'][0]:
-                for doc, metadata, distance in zip(
-                    results['documents'][0],
-                    results['metadatas'][0],
-                    results['distances'][0]
-                ):
-                    documents.append({
-                        'text': doc,
-                        'source': metadata.get('source', 'unknown'),
-                        'type': metadata.get('type', 'unknown'),
-                        'chunk_id': metadata.get('chunk_id', 0),
-                        'relevance': 1 - distance,  # Преобразуем distance в релевантность
-                        'distance': distance
-                    })
+        Returns:
+            Список документов с метаданными
+        """
+        if self._batch_queue is None:
+            self._batch_queue = asyncio.Queue()
+            self._batch_worker = asyncio.create_task(self._batch_loop())
+        
+        future = asyncio.get_running_loop().create_future()
+        self._batch_queue.put_nowait((query, future))
+        return await future
+    
+    async def _batch_loop(self):
+        """Собирает запросы aretrieve в пачки и запускает их выполнение."""
+        queue = self._batch_queue
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.batch_window
             
-            logger.info(f"Найдено {len(documents)} релевантных документов")
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
             
-            return documents
+            # Пачка выполняется отдельной задачей, чтобы сбор следующей
+            # не ждал ответа векторной БД
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+    
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        """
+        Выполняет пачку запросов и передает результаты ожидающим.
         
+        Args:
+            batch: Пары (запрос, future ожидающего)
+        """
+        queries = [query for query, _ in batch]
+        if len(batch) > 1:
+            logger.info(f"Пакетный поиск контекста: {len(batch)} запросов")
+        
+        try:
+            results = await asyncio.to_thread(self.retrieve_many, queries)
         except Exception as e:
-            logger.error(f"Ошибка получения контекста: {e}")
-            return []
+            logger.error(f"Ошибка пакетного получения контекста: {e}")
+            results = [[] for _ in batch]
+        
+        for (_, future), documents in zip(batch, results):
+            if not future.done():
+                future.set_result(documents)
+    
+    def _retrieve_batch(
+        self,
+        queries: List[str],
+        n_results: int,
+        filter_metadata: Optional[Dict],
+        embeddings: List[Optional[List[float]]]
+    ) -> List[List[Dict]]:
+        """
+        Получает контекст для запросов: кеш, затем общий поиск для остальных.
+        
+        Args:
+            queries: Поисковые запросы
+            n_results: Количество результатов на запрос
+            filter_metadata: Фильтр по метаданным
+            embeddings: Готовые эмбеддинги запросов (None - вычислить)
+            
+        Returns:
+            Списки документов в порядке запросов
+        """
+        results: List[Optional[List[Dict]]] = [None] * len(queries)
+        use_cache = bool(self.cache_size)
+        
+        pending = range(len(queries))
+        if use_cache:
+            params = orjson.dumps([n_results, filter_metadata], option=orjson.OPT_SORT_KEYS)
+            keys = [self._cache_key(query, params) for query in queries]
+            pending = []
+            for i, key in enumerate(keys):
+                documents = self._cache_get(key)
+                if documents is None:
+                    pending.append(i)
+                else:
+                    logger.info(f"Контекст найден в кеше: {len(documents)} документов")
+                    results[i] = documents
+            if not pending:
+                return results
+        
+        # Эмбеддинг нужен и для поиска похожего запроса, и для самого
+        # поиска в векторной БД - вычисляем его один раз, для всех
+        # недостающих запросов одним обращением к API
+        missing = [i for i in pending if embeddings[i] is None]
+        if missing:
+            created = self.vector_db.embed_queries([queries[i] for i in missing])
+            for i, embedding in zip(missing, created):
+                embeddings[i] = embedding
+        
+        to_search = list(pending)
+        vectors = {}
+        if use_cache:
+            to_search = []
+            for i in pending:
+                vector = np.asarray(embeddings[i], dtype=np.float32)
+                norm = float(np.linalg.norm(vector))
+                if norm:
+                    vector /= norm
+                
+                documents = self._cache_get_similar(vector, params)
+                if documents is None:
+                    vectors[i] = vector
+                    to_search.append(i)
+                else:
+                    results[i] = documents
+        
+        if to_search:
+            # Выполняем поиск в векторной БД одним запросом на всю пачку
+            found = self.vector_db.search_many_by_embedding(
+                [embeddings[i] for i in to_search],
+                n_results=n_results,
+                where=filter_metadata
+            )
+            for position, i in enumerate(to_search):
+                documents = self._format_results(found, position)
+                if use_cache:
+                    self._cache_put(keys[i], vectors[i], params, documents)
+                    documents = list(documents)
+                results[i] = documents
+        
+        return results
+    
+    @staticmethod
+    def _format_results(results: Dict, index: int = 0) -> List[Dict]:
+        """
+        Преобразует ответ векторной БД в список документов.
+        
+        Args:
+            results: Результаты поиска
+            index: Номер запроса в пакетном ответе
+            
+        Returns:
+            Список документов с метаданными
+        """
+        documents = []
+        if results['documents'] and results['documents'][index]:
+            distances = results['distances'][index]
+            # Преобразуем distance в релевантность одной векторной операцией
+            relevances = (1.0 - np.asarray(distances, dtype=np.float64)).tolist()
+            for doc, metadata, distance, relevance in zip(
+                results['documents'][index],
+                results['metadatas'][index],
+                distances,
+                relevances
+            ):
+                documents.append({
+                    'text': doc,
+                    'source': metadata.get('source', 'unknown'),
+                    'type': metadata.get('type', 'unknown'),
+                    'chunk_id': metadata.get('chunk_id', 0),
+                    'token_count': metadata.get('token_count'),
+                    'relevance': relevance,
+                    'distance': distance
+                })
+        return documents
+    
+    @staticmethod
+    def _cache_key(query: str, params: bytes) -> bytes:
+        """Строит ключ точного совпадения по нормализованному запросу."""
+        normalized = " ".join(query.lower().split())
+        return hashlib.blake2b(normalized.encode('utf-8') + b"\0" + params, digest_size=16).digest()
+    
+    def _cache_get(self, key: bytes) -> Optional[List[Dict]]:
+        """Ищет результат по точному совпадению запроса."""
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                self._cache_remove(key)
+                return None
+            self._cache.move_to_end(key)
+            return list(entry[3])
+    
+    def _cache_get_similar(self, vector: np.ndarray, params: bytes) -> Optional[List[Dict]]:
+        """Ищет результат близкого запроса с теми же параметрами поиска."""
+        with self._cache_lock:
+            if self._cache_vecs is None or not self._cache:
+                return None
+            
+            similarities = self._cache_vecs @ vector
+            candidates = np.flatnonzero(similarities >= self.similarity_threshold)
+            if not candidates.size:
+                return None
+            
+            now = time.monotonic()
+            # Кандидаты от самого близкого к менее близким
+            for row in candidates[np.argsort(-similarities[candidates])]:
+                key = self._row_keys[row]
+                entry = self._cache.get(key) if key is not None else None
+                if entry is None or entry[2] != params or entry[1] < now:
+                    continue
+                
+                self._cache.move_to_end(key)
+                logger.info(f"Контекст найден в кеше (близость {similarities[row]:.3f})")
+                return list(entry[3])
+        
+        return None
+    
+    def _cache_put(self, key: bytes, vector: np.ndarray, params: bytes, documents: List[Dict]):
+        """Сохраняет результат поиска в кеш."""
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache_remove(key)
+            
+            if self._cache_vecs is None or self._cache_vecs.shape[1] != vector.shape[0]:
+                self._cache.clear()
+                self._cache_vecs = np.zeros((self.cache_size, vector.shape[0]), dtype=np.float32)
+                self._free_rows = list(range(self.cache_size))
+                self._row_keys = [None] * self.cache_size
+            
+            if not self._free_rows:
+                oldest_key = next(iter(self._cache))
+                self._cache_remove(oldest_key)
+            
+            row = self._free_rows.pop()
+            self._cache_vecs[row] = vector
+            self._row_keys[row] = key
+            self._cache[key] = (row, time.monotonic() + self.cache_ttl, params, documents)
+    
+    def _cache_remove(self, key: bytes):
+        """Удаляет запись кеша и освобождает ее строку матрицы."""
+        row = self._cache.pop(key)[0]
+        self._cache_vecs[row] = 0.0
+        self._row_keys[row] = None
+        self._free_rows.append(row)
+    
+    def clear_cache(self):
+        """Очищает кеш результатов поиска (например, после обновления базы знаний)."""
+        with self._cache_lock:
+            self._cache.clear()
+            self._cache_vecs = None
+            self._free_rows = list(range(self.cache_size))
+            self._row_keys = [None] * self.cache_size
     
     def retrieve_with_threshold(
         self,
         query: str,
         relevance_threshold: float = 0.7,
-        n_results: int = None
+        n_results: int = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict]:
         """
         Получает контекст с фильтрацией по порогу релевантности.
@@ -99,17 +410,22 @@ class ContextRetriever:
             query: Поисковый запрос
             relevance_threshold: Минимальная релевантность (0-1)
             n_results: Количество результатов
+            query_embedding: Готовый эмбеддинг запроса (опционально)
             
         Returns:
             Список отфильтрованных документов
         """
-        documents = self.retrieve(query, n_results)
+        documents = self.retrieve(query, n_results, query_embedding=query_embedding)
         
-        # Фильтруем по релевантности
-        filtered = [
-            doc for doc in documents
-            if doc.get('relevance', 0) >= relevance_threshold
-        ]
+        # Фильтруем по релевантности: документы отсортированы по убыванию
+        # релевантности, поэтому границу находит двоичный поиск. Дозапрашивать
+        # соседей не нужно - следующие за найденными еще менее релевантны
+        cut = bisect.bisect_right(
+            documents,
+            -relevance_threshold,
+            key=lambda doc: -doc.get('relevance', 0)
+        )
+        filtered = documents[:cut]
         
         logger.info(
             f"После фильтрации (threshold={relevance_threshold}): "
@@ -126,8 +442,8 @@ class ContextRetriever:
             documents: Список документов
             
         Returns:
-            Список уникальных источников
+            Список уникальных источников в порядке первого появления
+            (документы отсортированы по релевантности)
         """
-        sources = [doc.get('source', 'unknown') for doc in documents]
-        return list(set(sources))
+        return list(dict.fromkeys(doc.get('source', 'unknown') for doc in documents))
 
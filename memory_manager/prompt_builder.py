@@ -8,6 +8,10 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Оценка для документов, проиндексированных без token_count
+# (русский текст - около двух символов на токен)
+_CHARS_PER_TOKEN = 2
+
 
 class PromptBuilder:
     """Построитель промптов для ИИ."""
@@ -15,17 +19,21 @@ class PromptBuilder:
     def __init__(
         self,
         system_prompt: str = None,
-        max_context_length: int = 4000
+        max_context_length: int = 4000,
+        max_context_tokens: Optional[int] = None
     ):
         """
         Инициализирует построитель промптов.
         
         Args:
             system_prompt: Системный промпт
-            max_context_length: Максимальная длина контекста
+            max_context_length: Максимальная длина контекста в символах
+            max_context_tokens: Максимальная длина контекста в токенах;
+                если задана, используется вместо max_context_length
         """
         self.system_prompt = system_prompt
         self.max_context_length = max_context_length
+        self.max_context_tokens = max_context_tokens
         
         logger.info("PromptBuilder инициализирован")
     
@@ -45,28 +53,43 @@ class PromptBuilder:
         if not documents:
             return "Контекст отсутствует."
         
+        # Части контекста собираются в один список и склеиваются один раз;
+        # текст документа не копируется в промежуточную строку
         context_parts = []
         total_length = 0
         
+        # Бюджет в токенах считается по token_count из метаданных чанков,
+        # без токенизации во время запроса
+        by_tokens = self.max_context_tokens is not None
+        limit = self.max_context_tokens if by_tokens else self.max_context_length
+        
         for i, doc in enumerate(documents, 1):
             text = doc.get('text', '')
             source = doc.get('source', 'unknown')
             relevance = doc.get('relevance', 0)
             
-            # Проверяем, не превысим ли лимит
-            doc_text = f"Документ {i} (Источник: {source}, Релевантность: {relevance:.2f}):\n{text}\n"
+            header = f"Документ {i} (Источник: {source}, Релевантность: {relevance:.2f}):\n"
+            doc_length = len(header) + len(text) + 1
+            if by_tokens:
+                token_count = doc.get('token_count')
+                if token_count is None:
+                    token_count = len(text) // _CHARS_PER_TOKEN
+                doc_length = token_count + len(header) // _CHARS_PER_TOKEN
             
-            if total_length + len(doc_text) > self.max_context_length:
+            # Проверяем, не превысим ли лимит
+            if total_length + doc_length > limit:
                 logger.warning(
                     f"Достигнут лимит контекста. "
                     f"Использовано {i-1} из {len(documents)} документов"
                 )
                 break
             
-            context_parts.append(doc_text)
-            total_length += len(doc_text)
+            if context_parts:
+                context_parts.append("\n---\n")
+            context_parts.extend((header, text, "\n"))
+            total_length += doc_length
         
-        return "\n---\n".join(context_parts)
+        return "".join(context_parts)
     
     def build_conversation_context(
         self,
@@ -156,6 +179,9 @@ class PromptBuilder:
         if len(text) <= max_length:
             return text
         
-        # Простое обрезание с многоточием
-        return text[:max_length - 3] + "..."
+        # Обрезаем по границе слова; многоточие - один символ
+        cut = text.rfind(' ', 0, max_length - 1)
+        if cut <= 0:
+            cut = max_length - 1
+        return f"{text[:cut]}…"
 
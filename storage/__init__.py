@@ -2,7 +2,7 @@
 
 from .vector_db import VectorDatabase
 from .user_db import UserDatabase
-from .document_loader import DocumentLoader
+from .document_loader import DocumentLoader, ChunkMeta
 
-__all__ = ["VectorDatabase", "UserDatabase", "DocumentLoader"]
+__all__ = ["VectorDatabase", "UserDatabase", "DocumentLoader", "ChunkMeta"]
 
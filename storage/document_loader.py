@@ -3,15 +3,62 @@
 Обрабатывает различные форматы документов и подготавливает их для индексации.
 """
 
+import io
 import os
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import Iterable, List, Dict, Tuple
 import re
 from bs4 import BeautifulSoup
 import logging
+import tiktoken
 
 logger = logging.getLogger(__name__)
 
+# Регулярные выражения очистки текста компилируются один раз
+_RE_SPACES = re.compile(r' +')
+_RE_NEWLINES = re.compile(r'\n{3,}')
+
+# Токенизатор моделей OpenAI: число токенов чанка считается один раз
+# при индексации и хранится в метаданных
+_TOKEN_ENCODING = "cl100k_base"
+
+# Разделители чанков по приоритету
+_SEPARATORS = ('\n\n', '\n', '. ', '! ', '? ', '; ', ', ', ' ')
+
+
+@dataclass(slots=True, frozen=True)
+class ChunkMeta:
+    """
+    Метаданные чанка.
+    
+    Без __dict__ у экземпляров: при индексации в памяти держатся метаданные
+    всех чанков. В словарь для ChromaDB преобразуются только при записи.
+    """
+    
+    source: str
+    type: str
+    chunk_id: int
+    total_chunks: int
+    char_count: int
+    token_count: int
+    
+    def to_dict(self) -> Dict:
+        """
+        Конвертирует метаданные в словарь для ChromaDB.
+        
+        Returns:
+            Словарь метаданных
+        """
+        return {
+            "source": self.source,
+            "type": self.type,
+            "chunk_id": self.chunk_id,
+            "total_chunks": self.total_chunks,
+            "char_count": self.char_count,
+            "token_count": self.token_count
+        }
+
 
 class DocumentLoader:
     """Загрузчик и обработчик документов."""
@@ -28,15 +75,11 @@ class DocumentLoader:
             Очищенный текст
         """
         try:
+            # Файл читается построчно: в памяти не держится его полная копия
+            # рядом со списком строк. Пустые строки отбрасываются, поэтому
+            # схлопывать переводы строк отдельно не нужно
             with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Очистка текста
-            content = re.sub(r' +', ' ', content)
-            content = re.sub(r'\n{3,}', '\n\n', content)
-            lines = [line.strip() for line in content.split('\n') if line.strip()]
-            
-            return '\n'.join(lines)
+                return DocumentLoader._clean_txt_lines(f)
         
         except Exception as e:
             logger.error(f"Ошибка загрузки TXT файла {file_path}: {e}")
@@ -54,31 +97,57 @@ class DocumentLoader:
             Очищенный текст из HTML
         """
         try:
+            # Парсим HTML прямо из файла, без промежуточной строки
             with open(file_path, 'r', encoding='utf-8') as f:
-                html_content = f.read()
-            
-            # Парсим HTML
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Удаляем script и style теги
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            # Извлекаем текст
-            text = soup.get_text()
-            
-            # Очистка
-            lines = [line.strip() for line in text.split('\n') if line.strip()]
-            text = '\n'.join(lines)
-            text = re.sub(r' +', ' ', text)
-            text = re.sub(r'\n{3,}', '\n\n', text)
-            
-            return text.strip()
+                return DocumentLoader._html_to_text(BeautifulSoup(f, 'lxml'))
         
         except Exception as e:
             logger.error(f"Ошибка загрузки HTML файла {file_path}: {e}")
             raise
     
+    @staticmethod
+    def _clean_txt_lines(lines: Iterable[str]) -> str:
+        """
+        Очищает строки текстового документа.
+        
+        Args:
+            lines: Строки документа
+            
+        Returns:
+            Очищенный текст
+        """
+        return '\n'.join(
+            _RE_SPACES.sub(' ', line)
+            for line in (raw.strip() for raw in lines)
+            if line
+        )
+    
+    @staticmethod
+    def _html_to_text(soup: BeautifulSoup) -> str:
+        """
+        Извлекает очищенный текст из разобранного HTML.
+        
+        Args:
+            soup: Разобранный HTML
+            
+        Returns:
+            Очищенный текст
+        """
+        # Удаляем script и style теги
+        for script in soup(["script", "style"]):
+            script.decompose()
+        
+        # Извлекаем текст
+        text = soup.get_text()
+        
+        # Очистка
+        lines = [line for line in (raw.strip() for raw in text.split('\n')) if line]
+        text = '\n'.join(lines)
+        text = _RE_SPACES.sub(' ', text)
+        text = _RE_NEWLINES.sub('\n\n', text)
+        
+        return text.strip()
+    
     @staticmethod
     def chunk_text(
         text: str,
@@ -99,54 +168,48 @@ class DocumentLoader:
         if len(text) <= chunk_size:
             return [text]
         
-        # Разделители по приоритету
-        separators = ['\n\n', '\n', '. ', '! ', '? ', '; ', ', ', ' ']
+        # Один проход по тексту: для каждого окна chunk_size ищется последняя
+        # граница самого приоритетного разделителя (str.rfind без копирования
+        # текста), следующий чанк начинается с перекрытием overlap
+        length = len(text)
+        chunks = []
+        start = 0
+        prev_end = 0
         
-        def split_recursive(text: str, seps: List[str]) -> List[str]:
-            """Рекурсивное разбиение по разделителям."""
-            if not text or len(text) <= chunk_size:
-                return [text] if text else []
+        while start < length:
+            limit = start + chunk_size
+            if limit >= length:
+                end = length
+            else:
+                end = limit
+                # Граница должна быть дальше конца предыдущего чанка, иначе
+                # перекрытие повторит уже выданный текст
+                floor = max(start + 1, prev_end)
+                for sep in _SEPARATORS:
+                    pos = text.rfind(sep, floor, limit)
+                    if pos != -1:
+                        end = pos + len(sep)
+                        break
             
-            for sep in seps:
-                if sep in text:
-                    parts = text.split(sep)
-                    result = []
-                    current = ""
-                    
-                    for part in parts:
-                        part_with_sep = part + sep if part != parts[-1] else part
-                        
-                        if len(current) + len(part_with_sep) <= chunk_size:
-                            current += part_with_sep
-                        else:
-                            if current:
-                                result.append(current.strip())
-                            
-                            if len(part_with_sep) > chunk_size:
-                                next_seps = seps[seps.index(sep) + 1:] if seps.index(sep) + 1 < len(seps) else []
-                                if next_seps:
-                                    result.extend(split_recursive(part_with_sep, next_seps))
-                                else:
-                                    # Простое разбиение
-                                    for i in range(0, len(part_with_sep), chunk_size - overlap):
-                                        result.append(part_with_sep[i:i + chunk_size])
-                                current = ""
-                            else:
-                                current = part_with_sep
-                    
-                    if current:
-                        result.append(current.strip())
-                    
-                    return result
+            chunk = text[start:end].strip()
+            if chunk:
+                chunks.append(chunk)
             
-            # Простое разбиение если нет разделителей
-            result = []
-            for i in range(0, len(text), chunk_size - overlap):
-                result.append(text[i:i + chunk_size])
-            return result
-        
-        chunks = split_recursive(text, separators)
-        return [c for c in chunks if c.strip()]
+            if end >= length:
+                break
+            
+            prev_end = end
+            next_start = end - overlap
+            if next_start <= start:
+                next_start = end
+            else:
+                # Перекрытие начинается с целого слова
+                space = text.find(' ', next_start, end)
+                if space != -1:
+                    next_start = space + 1
+            start = next_start
+        
+        return chunks
     
     @staticmethod
     def create_chunks_with_metadata(
@@ -155,7 +218,7 @@ class DocumentLoader:
         overlap: int,
         source: str,
         doc_type: str
-    ) -> List[Dict]:
+    ) -> List[Tuple[str, ChunkMeta]]:
         """
         Создает чанки с метаданными.
         
@@ -167,24 +230,48 @@ class DocumentLoader:
             doc_type: Тип документа
             
         Returns:
-            Список чанков с метаданными
+            Список пар (текст чанка, метаданные)
         """
         chunks = DocumentLoader.chunk_text(text, chunk_size, overlap)
+        return DocumentLoader.attach_metadata(chunks, source, doc_type)
+    
+    @staticmethod
+    def attach_metadata(
+        chunks: List[str],
+        source: str,
+        doc_type: str
+    ) -> List[Tuple[str, ChunkMeta]]:
+        """
+        Добавляет метаданные к готовым чанкам документа.
         
-        chunks_with_metadata = []
-        for i, chunk in enumerate(chunks):
-            chunks_with_metadata.append({
-                "text": chunk,
-                "metadata": {
-                    "source": source,
-                    "type": doc_type,
-                    "chunk_id": i,
-                    "total_chunks": len(chunks),
-                    "char_count": len(chunk)
-                }
-            })
-        
-        return chunks_with_metadata
+        Args:
+            chunks: Чанки документа по порядку
+            source: Источник (имя файла)
+            doc_type: Тип документа
+            
+        Returns:
+            Список пар (текст чанка, метаданные)
+        """
+        total_chunks = len(chunks)
+        token_counts = [
+            len(tokens)
+            for tokens in tiktoken.get_encoding(_TOKEN_ENCODING).encode_ordinary_batch(chunks)
+        ]
+        
+        return [
+            (
+                chunk,
+                ChunkMeta(
+                    source=source,
+                    type=doc_type,
+                    chunk_id=i,
+                    total_chunks=total_chunks,
+                    char_count=len(chunk),
+                    token_count=token_counts[i]
+                )
+            )
+            for i, chunk in enumerate(chunks)
+        ]
     
     @staticmethod
     def load_document(file_path: str) -> Tuple[str, str]:
@@ -209,4 +296,32 @@ class DocumentLoader:
             return text, 'html'
         else:
             raise ValueError(f"Неподдерживаемый формат: {file_ext}")
+    
+    @staticmethod
+    def load_from_bytes(data: bytes, suffix: str) -> Tuple[str, str]:
+        """
+        Загружает документ из уже прочитанного содержимого файла.
+        
+        Args:
+            data: Содержимое файла
+            suffix: Расширение файла (например, '.txt')
+            
+        Returns:
+            Кортеж (текст, тип_документа)
+        """
+        file_ext = suffix.lower()
+        
+        if file_ext == '.txt':
+            # StringIO делит строки так же, как открытый файл в load_txt:
+            # только по \n, \r и \r\n (splitlines делит и по \x0c, \u2028 и т.п.)
+            lines = io.StringIO(data.decode('utf-8'), newline=None)
+            text = DocumentLoader._clean_txt_lines(lines)
+            return text, 'txt'
+        elif file_ext in ['.html', '.htm']:
+            text = DocumentLoader._html_to_text(
+                BeautifulSoup(data, 'lxml', from_encoding='utf-8')
+            )
+            return text, 'html'
+        else:
+            raise ValueError(f"Неподдерживаемый формат: {file_ext}")
 
@@ -3,47 +3,243 @@
 Хранит персонализированную информацию о пользователях.
 """
 
-import json
+import atexit
 import os
-from typing import Dict, Optional, Any
+import queue
+import sqlite3
+import threading
+from typing import Dict, Optional, Any, Set
 from datetime import datetime
 import logging
 
+import orjson
+
 logger = logging.getLogger(__name__)
 
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    created_at TEXT NOT NULL,
+    last_active TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    preferences TEXT NOT NULL DEFAULT '{}',
+    metadata TEXT NOT NULL DEFAULT '{}'
+)
+"""
+
+_UPSERT_USER = """
+INSERT INTO users (id, name, created_at, last_active, message_count, preferences, metadata)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET
+    name = excluded.name,
+    last_active = excluded.last_active,
+    message_count = excluded.message_count,
+    preferences = excluded.preferences,
+    metadata = excluded.metadata
+"""
+
+_SELECT_USERS = """
+SELECT id, name, created_at, last_active, message_count, preferences, metadata
+FROM users
+"""
+
 
 class UserDatabase:
-    """Простая файловая БД для хранения данных пользователей."""
+    """БД пользователей на SQLite с кешем в памяти для чтения."""
     
-    def __init__(self, storage_path: str = "./user_data.json"):
+    def __init__(
+        self,
+        storage_path: str = "./user_data.db",
+        legacy_json_path: Optional[str] = None,
+        save_delay: float = 0.5
+    ):
         """
         Инициализирует БД пользователей.
         
         Args:
-            storage_path: Путь к файлу хранения
+            storage_path: Путь к файлу SQLite
+            legacy_json_path: JSON-файл прежнего формата; если база пуста,
+                пользователи из него импортируются один раз
+            save_delay: Задержка фоновой записи в секундах; изменения,
+                пришедшие за это время, записываются одной транзакцией
         """
         self.storage_path = storage_path
+        
+        # Каждое изменение записывает одну строку таблицы, а не весь файл;
+        # WAL не блокирует чтение на время записи и переживает падение
+        # процесса посреди записи
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            storage_path,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_CREATE_TABLE)
+        
+        # Все пользователи держатся в памяти: чтения не обращаются к диску
         self.users = self._load_users()
+        if not self.users and legacy_json_path:
+            self._import_json(legacy_json_path)
+        
+        # Изменения только отмечают пользователя; фоновый поток записывает
+        # отмеченных одной транзакцией, так что серия сообщений не приводит
+        # к записи на каждое сообщение
+        self.save_delay = save_delay
+        self._dirty_ids: Set[str] = set()
+        self._closed = False
+        self._stop_event = threading.Event()
+        self._save_queue: "queue.Queue[None]" = queue.Queue(maxsize=1)
+        self._writer = threading.Thread(
+            target=self._writer_loop,
+            name="user-db-writer",
+            daemon=True
+        )
+        self._writer.start()
+        # Несохраненные изменения записываются и при выходе без close()
+        atexit.register(self.close)
+        
         logger.info(f"UserDB инициализирована: {storage_path}")
     
     def _load_users(self) -> Dict:
-        """Загружает данные пользователей из файла."""
-        if os.path.exists(self.storage_path):
+        """Загружает данные пользователей из базы."""
+        users = {}
+        try:
+            for row in self._conn.execute(_SELECT_USERS):
+                users[row[0]] = {
+                    "id": row[0],
+                    "name": row[1],
+                    "created_at": row[2],
+                    "last_active": row[3],
+                    "message_count": row[4],
+                    "preferences": orjson.loads(row[5]),
+                    "metadata": orjson.loads(row[6])
+                }
+        except Exception as e:
+            logger.error(f"Ошибка загрузки user_db: {e}")
+        return users
+    
+    def _import_json(self, json_path: str):
+        """
+        Импортирует пользователей из JSON-файла прежнего формата.
+        
+        Args:
+            json_path: Путь к JSON-файлу
+        """
+        if not os.path.exists(json_path):
+            return
+        
+        try:
+            with open(json_path, 'rb') as f:
+                users = orjson.loads(f.read())
+            
+            with self._lock:
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.executemany(
+                        _UPSERT_USER,
+                        [self._to_row(user) for user in users.values()]
+                    )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            
+            self.users = users
+            logger.info(f"Импортировано пользователей из {json_path}: {len(users)}")
+        except Exception as e:
+            logger.error(f"Ошибка импорта user_db из {json_path}: {e}")
+    
+    @staticmethod
+    def _to_row(user: Dict) -> tuple:
+        """Преобразует данные пользователя в строку таблицы."""
+        return (
+            user["id"],
+            user["name"],
+            user["created_at"],
+            user["last_active"],
+            user["message_count"],
+            orjson.dumps(user["preferences"], option=orjson.OPT_NON_STR_KEYS).decode('utf-8'),
+            orjson.dumps(user["metadata"], option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        )
+    
+    def _mark_dirty(self, user_id: str):
+        """
+        Отмечает пользователя для фоновой записи.
+        
+        Вызывается под self._lock.
+        
+        Args:
+            user_id: ID пользователя
+        """
+        self._dirty_ids.add(user_id)
+        try:
+            self._save_queue.put_nowait(None)
+        except queue.Full:
+            # Запись уже запланирована и сохранит актуальное состояние
+            pass
+    
+    def _flush(self):
+        """Записывает отмеченных пользователей в базу одной транзакцией."""
+        with self._lock:
+            if not self._dirty_ids or self._closed:
+                return
+            
             try:
-                with open(self.storage_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                rows = [self._to_row(self.users[user_id]) for user_id in self._dirty_ids]
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.executemany(_UPSERT_USER, rows)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                self._dirty_ids.clear()
             except Exception as e:
-                logger.error(f"Ошибка загрузки user_db: {e}")
-                return {}
-        return {}
+                logger.error(f"Ошибка сохранения user_db: {e}")
+    
+    def _writer_loop(self):
+        """Записывает изменения в базу по запросам из очереди."""
+        while True:
+            self._save_queue.get()
+            
+            # Изменения, пришедшие за время задержки, попадут в ту же запись
+            self._stop_event.wait(self.save_delay)
+            try:
+                self._save_queue.get_nowait()
+            except queue.Empty:
+                pass
+            
+            self._flush()
+            
+            if self._stop_event.is_set() and self._save_queue.empty():
+                return
+    
+    @staticmethod
+    def _now() -> str:
+        """Текущее время в ISO 8601; вычисляется один раз на операцию."""
+        return datetime.now().isoformat()
     
-    def _save_users(self):
-        """Сохраняет данные пользователей в файл."""
+    def close(self):
+        """Записывает несохраненные изменения и закрывает соединение с базой."""
+        if self._closed:
+            return
+        
+        self._stop_event.set()
         try:
-            with open(self.storage_path, 'w', encoding='utf-8') as f:
-                json.dump(self.users, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"Ошибка сохранения user_db: {e}")
+            self._save_queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._writer.join(timeout=10)
+        
+        # Если поток записи не успел, дописываем здесь
+        self._flush()
+        with self._lock:
+            self._closed = True
+            self._conn.close()
+        atexit.unregister(self.close)
     
     def get_user(self, user_id: str) -> Optional[Dict]:
         """
@@ -72,28 +268,31 @@ class UserDatabase:
             metadata: Дополнительные метаданные
         """
         user_id = str(user_id)
+        now = self._now()
         
-        if user_id not in self.users:
-            # Создаем нового пользователя
-            self.users[user_id] = {
-                "id": user_id,
-                "name": name,
-                "created_at": datetime.now().isoformat(),
-                "last_active": datetime.now().isoformat(),
-                "message_count": 0,
-                "preferences": {},
-                "metadata": metadata or {}
-            }
-            logger.info(f"Создан пользователь {user_id}")
-        else:
-            # Обновляем существующего
-            if name:
-                self.users[user_id]["name"] = name
-            self.users[user_id]["last_active"] = datetime.now().isoformat()
-            if metadata:
-                self.users[user_id]["metadata"].update(metadata)
-        
-        self._save_users()
+        with self._lock:
+            user = self.users.get(user_id)
+            if user is None:
+                # Создаем нового пользователя
+                self.users[user_id] = {
+                    "id": user_id,
+                    "name": name,
+                    "created_at": now,
+                    "last_active": now,
+                    "message_count": 0,
+                    "preferences": {},
+                    "metadata": metadata or {}
+                }
+                logger.info(f"Создан пользователь {user_id}")
+            else:
+                # Обновляем существующего
+                if name:
+                    user["name"] = name
+                user["last_active"] = now
+                if metadata:
+                    user["metadata"].update(metadata)
+            
+            self._mark_dirty(user_id)
     
     def increment_message_count(self, user_id: str):
         """
@@ -103,10 +302,45 @@ class UserDatabase:
             user_id: ID пользователя
         """
         user_id = str(user_id)
-        if user_id in self.users:
-            self.users[user_id]["message_count"] += 1
-            self.users[user_id]["last_active"] = datetime.now().isoformat()
-            self._save_users()
+        with self._lock:
+            user = self.users.get(user_id)
+            if user is not None:
+                user["message_count"] += 1
+                user["last_active"] = self._now()
+                self._mark_dirty(user_id)
+    
+    def touch(self, user_id: str, name: Optional[str] = None):
+        """
+        Регистрирует сообщение пользователя: создает или обновляет его
+        и увеличивает счетчик сообщений одним изменением.
+        
+        Args:
+            user_id: ID пользователя
+            name: Имя пользователя
+        """
+        user_id = str(user_id)
+        now = self._now()
+        
+        with self._lock:
+            user = self.users.get(user_id)
+            if user is None:
+                self.users[user_id] = {
+                    "id": user_id,
+                    "name": name,
+                    "created_at": now,
+                    "last_active": now,
+                    "message_count": 1,
+                    "preferences": {},
+                    "metadata": {}
+                }
+                logger.info(f"Создан пользователь {user_id}")
+            else:
+                if name:
+                    user["name"] = name
+                user["last_active"] = now
+                user["message_count"] += 1
+            
+            self._mark_dirty(user_id)
     
     def set_preference(self, user_id: str, key: str, value: Any):
         """
@@ -118,9 +352,10 @@ class UserDatabase:
             value: Значение
         """
         user_id = str(user_id)
-        if user_id in self.users:
-            self.users[user_id]["preferences"][key] = value
-            self._save_users()
+        with self._lock:
+            if user_id in self.users:
+                self.users[user_id]["preferences"][key] = value
+                self._mark_dirty(user_id)
     
     def get_preference(self, user_id: str, key: str, default: Any = None) -> Any:
         """
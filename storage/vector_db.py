@@ -5,12 +5,27 @@
 
 import chromadb
 from chromadb.config import Settings as ChromaSettings
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence, Union
+import asyncio
 import openai
 import logging
 
+from .document_loader import ChunkMeta
+from utils.embedding_cache import EmbeddingCache
+
 logger = logging.getLogger(__name__)
 
+# Количество текстов в одном запросе эмбеддингов
+_EMBEDDING_BATCH_SIZE = 100
+
+
+def _to_chroma_metadatas(metadatas: Sequence[Union[Dict, ChunkMeta]]) -> List[Dict]:
+    """Преобразует метаданные в словари, которые принимает ChromaDB."""
+    return [
+        metadata.to_dict() if isinstance(metadata, ChunkMeta) else metadata
+        for metadata in metadatas
+    ]
+
 
 class VectorDatabase:
     """Обертка для работы с ChromaDB."""
@@ -19,7 +34,11 @@ class VectorDatabase:
         self,
         persist_directory: str,
         collection_name: str,
-        openai_api_key: str
+        openai_api_key: str,
+        embedding_model: str = "text-embedding-3-small",
+        embedding_dimensions: Optional[int] = None,
+        embedding_concurrency: int = 8,
+        embedding_cache: Optional[EmbeddingCache] = None
     ):
         """
         Инициализирует векторную БД.
@@ -28,13 +47,35 @@ class VectorDatabase:
             persist_directory: Директория хранения данных
             collection_name: Имя коллекции
             openai_api_key: API ключ OpenAI для эмбеддингов
+            embedding_model: Модель эмбеддингов
+            embedding_dimensions: Размерность укороченных эмбеддингов
+                (None - полная размерность модели). Меньшая размерность
+                уменьшает коллекцию и ускоряет поиск; после изменения
+                документы нужно переиндексировать
+            embedding_concurrency: Максимум одновременных запросов
+                эмбеддингов при асинхронной индексации
+            embedding_cache: Постоянный кеш эмбеддингов документов
+                (опционально); запросы пользователей в нем не сохраняются
         """
         self.persist_directory = persist_directory
         self.collection_name = collection_name
+        self.embedding_model = embedding_model
+        self.embedding_dimensions = embedding_dimensions
         
         # Инициализируем OpenAI
         openai.api_key = openai_api_key
         self.openai = openai
+        self.openai_api_key = openai_api_key
+        self.embedding_concurrency = embedding_concurrency
+        # Асинхронный клиент нужен только при индексации и создается
+        # при первом использовании
+        self._async_openai: Optional[openai.AsyncOpenAI] = None
+        # Ограничение одновременных запросов общее для всех вызовов
+        # в одном цикле событий: (цикл, семафор)
+        self._embedding_semaphore: Optional[tuple] = None
+        self.embedding_cache = embedding_cache
+        # Эмбеддинги разных моделей и размерностей кешируются раздельно
+        self._cache_model = f"{embedding_model}:{embedding_dimensions or 'default'}"
         
         # Инициализируем ChromaDB клиент с персистентностью
         self.client = chromadb.PersistentClient(
@@ -65,15 +106,16 @@ class VectorDatabase:
     def add_documents(
         self,
         texts: List[str],
-        metadatas: List[Dict],
+        metadatas: Sequence[Union[Dict, ChunkMeta]],
         ids: Optional[List[str]] = None
     ):
         """
-        Добавляет документы в коллекцию.
+        Добавляет документы в коллекцию; документы с существующими ID
+        перезаписываются.
         
         Args:
             texts: Список текстов
-            metadatas: Список метаданных
+            metadatas: Список метаданных (словари или ChunkMeta)
             ids: Список ID документов
         """
         if not self.collection:
@@ -85,13 +127,17 @@ class VectorDatabase:
         try:
             # Создаем эмбеддинги через OpenAI
             logger.info(f"Создание эмбеддингов для {len(texts)} документов...")
-            embeddings = self._create_embeddings(texts)
+            embeddings, missing = self._get_cached_embeddings(texts)
+            if missing:
+                created = self._create_embeddings(list(missing))
+                self._store_created_embeddings(embeddings, missing, created)
             
-            # Добавляем в коллекцию
-            self.collection.add(
+            # Добавляем в коллекцию (upsert: повторная индексация того же
+            # чанка не создает дубликат)
+            self.collection.upsert(
                 documents=texts,
                 embeddings=embeddings,
-                metadatas=metadatas,
+                metadatas=_to_chroma_metadatas(metadatas),
                 ids=ids
             )
             logger.info(f"Добавлено {len(texts)} документов")
@@ -99,6 +145,68 @@ class VectorDatabase:
             logger.error(f"Ошибка добавления документов: {e}")
             raise
     
+    async def add_documents_async(
+        self,
+        texts: List[str],
+        metadatas: Sequence[Union[Dict, ChunkMeta]],
+        ids: Optional[List[str]] = None
+    ):
+        """
+        Добавляет документы в коллекцию, запрашивая эмбеддинги пачек
+        параллельно; документы с существующими ID перезаписываются.
+        
+        Args:
+            texts: Список текстов
+            metadatas: Список метаданных (словари или ChunkMeta)
+            ids: Список ID документов
+        """
+        if not self.collection:
+            self.get_or_create_collection()
+        
+        if ids is None:
+            ids = [f"doc_{i}" for i in range(len(texts))]
+        
+        try:
+            logger.info(f"Создание эмбеддингов для {len(texts)} документов...")
+            embeddings, missing = self._get_cached_embeddings(texts)
+            if missing:
+                created = await self._acreate_embeddings(list(missing))
+                self._store_created_embeddings(embeddings, missing, created)
+            
+            # Запись в ChromaDB синхронная; в отдельном потоке она не мешает
+            # запросам эмбеддингов других пачек
+            await asyncio.to_thread(
+                self.collection.upsert,
+                documents=texts,
+                embeddings=embeddings,
+                metadatas=_to_chroma_metadatas(metadatas),
+                ids=ids
+            )
+            logger.info(f"Добавлено {len(texts)} документов")
+        except Exception as e:
+            logger.error(f"Ошибка добавления документов: {e}")
+            raise
+    
+    def delete_documents(self, ids: List[str]):
+        """
+        Удаляет документы из коллекции.
+        
+        Args:
+            ids: Список ID документов
+        """
+        if not ids:
+            return
+        
+        if not self.collection:
+            self.get_or_create_collection()
+        
+        try:
+            self.collection.delete(ids=ids)
+            logger.info(f"Удалено {len(ids)} документов")
+        except Exception as e:
+            logger.error(f"Ошибка удаления документов: {e}")
+            raise
+    
     def search(
         self,
         query: str,
@@ -116,21 +224,105 @@ class VectorDatabase:
         Returns:
             Результаты поиска
         """
+        return self.search_by_embedding(
+            self.embed_query(query),
+            n_results=n_results,
+            where=where
+        )
+    
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Создает эмбеддинг поискового запроса.
+        
+        Args:
+            query: Поисковый запрос
+            
+        Returns:
+            Вектор эмбеддинга
+        """
+        return self._create_embeddings([query])[0]
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Создает эмбеддинги нескольких поисковых запросов одним обращением к API.
+        
+        Args:
+            queries: Поисковые запросы
+            
+        Returns:
+            Векторы эмбеддингов в порядке запросов
+        """
+        return self._create_embeddings(queries)
+    
+    def search_by_embedding(
+        self,
+        embedding: List[float],
+        n_results: int = 5,
+        where: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Выполняет поиск по готовому эмбеддингу запроса.
+        
+        Args:
+            embedding: Эмбеддинг запроса
+            n_results: Количество результатов
+            where: Фильтр по метаданным
+            
+        Returns:
+            Результаты поиска
+        """
+        return self.search_many_by_embedding([embedding], n_results=n_results, where=where)
+    
+    def search_many(
+        self,
+        queries: List[str],
+        n_results: int = 5,
+        where: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Выполняет семантический поиск сразу по нескольким запросам:
+        один запрос эмбеддингов и один запрос к коллекции.
+        
+        Args:
+            queries: Поисковые запросы
+            n_results: Количество результатов на запрос
+            where: Фильтр по метаданным
+            
+        Returns:
+            Результаты поиска; списки в них идут в порядке запросов
+        """
+        return self.search_many_by_embedding(
+            self.embed_queries(queries),
+            n_results=n_results,
+            where=where
+        )
+    
+    def search_many_by_embedding(
+        self,
+        embeddings: List[List[float]],
+        n_results: int = 5,
+        where: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Выполняет поиск по готовым эмбеддингам нескольких запросов.
+        
+        Args:
+            embeddings: Эмбеддинги запросов
+            n_results: Количество результатов на запрос
+            where: Фильтр по метаданным
+            
+        Returns:
+            Результаты поиска; списки в них идут в порядке эмбеддингов
+        """
         if not self.collection:
             self.get_or_create_collection()
         
         try:
-            # Создаем эмбеддинг для запроса
-            query_embedding = self._create_embeddings([query])[0]
-            
-            # Выполняем поиск
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
+            return self.collection.query(
+                query_embeddings=embeddings,
                 n_results=n_results,
                 where=where
             )
-            
-            return results
         except Exception as e:
             logger.error(f"Ошибка поиска: {e}")
             raise
@@ -146,16 +338,14 @@ class VectorDatabase:
             Список векторов эмбеддингов
         """
         embeddings = []
-        batch_size = 100
+        batch_size = _EMBEDDING_BATCH_SIZE
+        options = self._embedding_options()
         
         for i in range(0, len(texts), batch_size):
             batch = texts[i:i + batch_size]
             
             try:
-                response = self.openai.embeddings.create(
-                    input=batch,
-                    model="text-embedding-3-small"
-                )
+                response = self.openai.embeddings.create(input=batch, **options)
                 
                 batch_embeddings = [item.embedding for item in response.data]
                 embeddings.extend(batch_embeddings)
@@ -166,6 +356,103 @@ class VectorDatabase:
         
         return embeddings
     
+    async def _acreate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Создает эмбеддинги через асинхронный клиент OpenAI: пачки
+        запрашиваются параллельно, не более embedding_concurrency сразу
+        с учетом одновременных вызовов.
+        
+        Args:
+            texts: Список текстов
+            
+        Returns:
+            Список векторов эмбеддингов в порядке текстов
+        """
+        if self._async_openai is None:
+            self._async_openai = openai.AsyncOpenAI(api_key=self.openai_api_key)
+        
+        client = self._async_openai
+        options = self._embedding_options()
+        
+        loop = asyncio.get_running_loop()
+        if self._embedding_semaphore is None or self._embedding_semaphore[0] is not loop:
+            self._embedding_semaphore = (loop, asyncio.Semaphore(self.embedding_concurrency))
+        semaphore = self._embedding_semaphore[1]
+        
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                response = await client.embeddings.create(input=batch, **options)
+            return [item.embedding for item in response.data]
+        
+        try:
+            batches = await asyncio.gather(*(
+                embed_batch(texts[i:i + _EMBEDDING_BATCH_SIZE])
+                for i in range(0, len(texts), _EMBEDDING_BATCH_SIZE)
+            ))
+        except Exception as e:
+            logger.error(f"Ошибка создания эмбеддингов: {e}")
+            raise
+        
+        return [embedding for batch in batches for embedding in batch]
+    
+    def _get_cached_embeddings(self, texts: List[str]) -> tuple:
+        """
+        Берет эмбеддинги документов из постоянного кеша.
+        
+        Args:
+            texts: Список текстов
+            
+        Returns:
+            Кортеж (эмбеддинги с None на месте отсутствующих,
+            словарь {текст без эмбеддинга: его индексы})
+        """
+        if self.embedding_cache is None:
+            embeddings = [None] * len(texts)
+        else:
+            embeddings = self.embedding_cache.get_many(texts, self._cache_model)
+        
+        # Одинаковые чанки (общие шапки, повторяющиеся разделы) получают
+        # эмбеддинг одним запросом
+        missing: Dict[str, List[int]] = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(texts[i], []).append(i)
+        
+        missing_count = sum(map(len, missing.values()))
+        if self.embedding_cache is not None:
+            logger.info(f"Эмбеддинги из кеша: {len(texts) - missing_count} из {len(texts)}")
+        if len(missing) < missing_count:
+            logger.info(f"Повторяющихся чанков без эмбеддинга: {missing_count - len(missing)}")
+        return embeddings, missing
+    
+    def _store_created_embeddings(
+        self,
+        embeddings: List[Optional[List[float]]],
+        missing: Dict[str, List[int]],
+        created: List[List[float]]
+    ):
+        """
+        Подставляет созданные эмбеддинги на их места и сохраняет их в кеш.
+        
+        Args:
+            embeddings: Эмбеддинги с None на месте отсутствующих
+            missing: Словарь {текст без эмбеддинга: его индексы}
+            created: Созданные эмбеддинги в порядке missing
+        """
+        for positions, embedding in zip(missing.values(), created):
+            for i in positions:
+                embeddings[i] = embedding
+        
+        if self.embedding_cache is not None:
+            self.embedding_cache.put_many(list(missing), self._cache_model, created)
+    
+    def _embedding_options(self) -> Dict:
+        """Параметры запроса эмбеддингов, кроме входных текстов."""
+        options = {"model": self.embedding_model}
+        if self.embedding_dimensions:
+            options["dimensions"] = self.embedding_dimensions
+        return options
+    
     def get_stats(self) -> Dict:
         """
         Получает статистику коллекции.
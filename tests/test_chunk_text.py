@@ -0,0 +1,155 @@
+"""
+Тесты DocumentLoader.chunk_text в сравнении с исходной рекурсивной реализацией.
+
+Однопроходный алгоритм не обязан совпадать с рекурсивным побайтно: он
+учитывает overlap для всех чанков, а не только при жестком разбиении.
+Сравниваются свойства, которые должны сохраниться: текст не теряется
+и не переставляется, чанки не длиннее chunk_size, их не больше, чем
+у исходной реализации, а на тексте из уникальных абзацев результат совпадает.
+"""
+
+import random
+from typing import List
+
+import pytest
+
+from storage.document_loader import DocumentLoader
+
+
+def _baseline_chunk_text(text: str, chunk_size: int = 500, overlap: int = 100) -> List[str]:
+    """Исходная реализация chunk_text (до перехода на один проход), без изменений."""
+    if len(text) <= chunk_size:
+        return [text]
+    
+    # Разделители по приоритету
+    separators = ['\n\n', '\n', '. ', '! ', '? ', '; ', ', ', ' ']
+    
+    def split_recursive(text: str, seps: List[str]) -> List[str]:
+        """Рекурсивное разбиение по разделителям."""
+        if not text or len(text) <= chunk_size:
+            return [text] if text else []
+        
+        for sep in seps:
+            if sep in text:
+                parts = text.split(sep)
+                result = []
+                current = ""
+                
+                for part in parts:
+                    part_with_sep = part + sep if part != parts[-1] else part
+                    
+                    if len(current) + len(part_with_sep) <= chunk_size:
+                        current += part_with_sep
+                    else:
+                        if current:
+                            result.append(current.strip())
+                        
+                        if len(part_with_sep) > chunk_size:
+                            next_seps = seps[seps.index(sep) + 1:] if seps.index(sep) + 1 < len(seps) else []
+                            if next_seps:
+                                result.extend(split_recursive(part_with_sep, next_seps))
+                            else:
+                                # Простое разбиение
+                                for i in range(0, len(part_with_sep), chunk_size - overlap):
+                                    result.append(part_with_sep[i:i + chunk_size])
+                            current = ""
+                        else:
+                            current = part_with_sep
+                
+                if current:
+                    result.append(current.strip())
+                
+                return result
+        
+        # Простое разбиение если нет разделителей
+        result = []
+        for i in range(0, len(text), chunk_size - overlap):
+            result.append(text[i:i + chunk_size])
+        return result
+    
+    chunks = split_recursive(text, separators)
+    return [c for c in chunks if c.strip()]
+
+
+WORDS = ["альфа", "beta", "гамма", "delta", "эпсилон", "zeta", "x", "слово_без_пробелов_длиной_35_знаков"]
+SEPARATORS = [" "] * 12 + [". ", ", ", "; ", "! ", "? ", "\n", "\n\n"]
+CHUNK_SIZES = [50, 80, 120, 300, 500]
+
+
+def random_text(rng: random.Random) -> str:
+    # Номер делает слова уникальными: положение чанка в тексте однозначно
+    parts = []
+    for i in range(rng.randint(1, 400)):
+        parts.append(f"{rng.choice(WORDS)}{i}")
+        parts.append(rng.choice(SEPARATORS))
+    return "".join(parts)
+
+
+def non_whitespace(chunks: List[str]) -> str:
+    return "".join("".join(chunk.split()) for chunk in chunks)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_baseline_without_overlap(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        text = random_text(rng)
+        chunk_size = rng.choice(CHUNK_SIZES)
+        
+        chunks = DocumentLoader.chunk_text(text, chunk_size, 0)
+        baseline = _baseline_chunk_text(text, chunk_size, 0)
+        
+        # Без перекрытия оба алгоритма делят текст без потерь и перестановок
+        assert non_whitespace(chunks) == non_whitespace(baseline) == "".join(text.split())
+        assert all(len(chunk) <= chunk_size for chunk in chunks)
+        assert len(chunks) <= len(baseline)
+        if len(text) > chunk_size:
+            assert all(chunk and chunk == chunk.strip() for chunk in chunks)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_same_chunks_as_baseline_for_paragraphs(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        chunk_size = rng.choice(CHUNK_SIZES[1:])
+        # Уникальные абзацы: исходная реализация теряет разделитель
+        # после абзаца, совпадающего с последним
+        paragraphs = [
+            " ".join(rng.choice(WORDS[:-1]) for _ in range(rng.randint(1, 6))) + f" {i}"
+            for i in range(rng.randint(1, 40))
+        ]
+        text = "\n\n".join(paragraphs)
+        
+        assert DocumentLoader.chunk_text(text, chunk_size, 0) == _baseline_chunk_text(text, chunk_size, 0)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_overlap_covers_text_in_order(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        text = random_text(rng)
+        chunk_size = rng.choice(CHUNK_SIZES)
+        overlap = rng.randint(0, chunk_size // 3)
+        
+        chunks = DocumentLoader.chunk_text(text, chunk_size, overlap)
+        if len(text) <= chunk_size:
+            assert chunks == _baseline_chunk_text(text, chunk_size, overlap)
+            continue
+        
+        # Каждый чанк - отрезок текста, начинающийся не раньше чем за overlap
+        # до конца предыдущего; вместе они покрывают весь текст, кроме пробелов
+        covered = [False] * len(text)
+        prev_start, prev_end = 0, 0
+        for chunk in chunks:
+            assert len(chunk) <= chunk_size
+            start = text.find(chunk, max(prev_start, prev_end - overlap))
+            assert start != -1
+            covered[start:start + len(chunk)] = [True] * len(chunk)
+            prev_start, prev_end = start, start + len(chunk)
+        
+        assert all(covered[i] for i, char in enumerate(text) if not char.isspace())
+
+
+def test_short_text_is_single_chunk():
+    assert DocumentLoader.chunk_text("короткий текст", 500, 100) == ["короткий текст"]
+    assert _baseline_chunk_text("короткий текст", 500, 100) == ["короткий текст"]
@@ -0,0 +1,85 @@
+"""
+Тесты постоянного кеша эмбеддингов (SQLite, векторы в float16).
+"""
+
+import numpy as np
+import pytest
+
+from utils.embedding_cache import EmbeddingCache
+
+
+MODEL = "text-embedding-3-small"
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "embeddings.db")
+
+
+@pytest.fixture
+def cache(cache_path):
+    cache = EmbeddingCache(cache_path)
+    yield cache
+    cache.close()
+
+
+def test_float16_round_trip(cache):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((3, 1536)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    texts = ["первый", "второй", "третий"]
+    
+    cache.put_many(texts, MODEL, vectors.tolist())
+    restored = cache.get_many(texts, MODEL)
+    
+    for vector, cached in zip(vectors, restored):
+        assert isinstance(cached, list) and len(cached) == 1536
+        assert all(isinstance(x, float) for x in cached[:5])
+        # float16: точность около 3 значащих цифр, косинус почти 1
+        cached = np.asarray(cached, dtype=np.float32)
+        np.testing.assert_allclose(cached, vector, rtol=1e-3, atol=1e-4)
+        assert float(cached @ vector) / float(np.linalg.norm(cached)) > 0.9999
+
+
+def test_round_trip_is_exact_for_float16_values(cache):
+    vector = [0.0, 1.0, -0.5, 0.25, 65504.0, -2.0 ** -14]
+    
+    cache.put_many(["t"], MODEL, [vector])
+    
+    assert cache.get_many(["t"], MODEL) == [vector]
+
+
+def test_misses_keep_order(cache):
+    cache.put_many(["a", "c"], MODEL, [[1.0, 2.0], [3.0, 4.0]])
+    
+    assert cache.get_many(["a", "b", "c"], MODEL) == [[1.0, 2.0], None, [3.0, 4.0]]
+    assert cache.get_many([], MODEL) == []
+
+
+def test_key_includes_model(cache):
+    cache.put_many(["a"], MODEL, [[1.0]])
+    
+    assert cache.get_many(["a"], "text-embedding-3-large") == [None]
+    assert EmbeddingCache.make_key("a", MODEL) != EmbeddingCache.make_key("a", MODEL + "x")
+
+
+def test_put_replaces_and_persists(cache_path):
+    cache = EmbeddingCache(cache_path)
+    cache.put_many(["a"], MODEL, [[1.0, 1.0]])
+    cache.put_many(["a"], MODEL, [[2.0, 2.0]])
+    cache.close()
+    
+    reopened = EmbeddingCache(cache_path)
+    try:
+        assert reopened.get_many(["a"], MODEL) == [[2.0, 2.0]]
+    finally:
+        reopened.close()
+
+
+def test_get_many_more_than_select_batch(cache):
+    texts = [f"текст {i}" for i in range(1200)]
+    cache.put_many(texts, MODEL, [[float(i)] for i in range(1200)])
+    
+    restored = cache.get_many(texts[::-1], MODEL)
+    
+    assert restored == [[float(i)] for i in reversed(range(1200))]
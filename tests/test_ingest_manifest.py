@@ -0,0 +1,147 @@
+"""
+Тесты манифеста инкрементальной индексации: пропуск неизмененных файлов
+и удаление чанков измененных и удаленных.
+"""
+
+import os
+
+import pytest
+
+from tools.ingest_documents import (
+    find_changes,
+    load_manifest,
+    record_indexed_files,
+    save_manifest,
+)
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    directory = tmp_path / "data"
+    directory.mkdir()
+    return directory
+
+
+def write(path, text, mtime_ns=None):
+    path.write_text(text, encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return str(path)
+
+
+def index(paths, indexed, ids_by_path, prune_dir=None):
+    """Индексирует измененные файлы; возвращает (измененные, удаленные ID)."""
+    deleted = []
+    stamps, changed, removed = find_changes(paths, indexed, prune_dir)
+    for key in removed:
+        deleted.extend(indexed.pop(key)["ids"])
+    record_indexed_files(
+        indexed,
+        stamps,
+        [(path, ids_by_path[path]) for path in changed],
+        deleted.extend
+    )
+    return changed, deleted
+
+
+def test_unchanged_files_are_skipped(data_dir):
+    a = write(data_dir / "a.txt", "первый", mtime_ns=1_000_000_000)
+    b = write(data_dir / "b.txt", "второй", mtime_ns=1_000_000_000)
+    indexed = {}
+    
+    changed, deleted = index([a, b], indexed, {a: ["a1"], b: ["b1"]})
+    assert changed == [a, b]
+    assert deleted == []
+    assert indexed[os.path.abspath(a)] == {
+        "mtime_ns": 1_000_000_000, "size": len("первый".encode("utf-8")), "ids": ["a1"]
+    }
+    
+    stamps, changed, removed = find_changes([a, b], indexed)
+    assert (stamps, changed, removed) == ({}, [], [])
+
+
+def test_mtime_change_reindexes_and_deletes_stale_ids(data_dir):
+    a = write(data_dir / "a.txt", "текст", mtime_ns=1_000_000_000)
+    indexed = {}
+    index([a], indexed, {a: ["keep", "old"]})
+    
+    # Тот же размер, другое время изменения
+    write(data_dir / "a.txt", "тексТ", mtime_ns=2_000_000_000)
+    changed, deleted = index([a], indexed, {a: ["keep", "new"]})
+    
+    assert changed == [a]
+    assert deleted == ["old"]
+    assert indexed[os.path.abspath(a)]["ids"] == ["keep", "new"]
+    assert indexed[os.path.abspath(a)]["mtime_ns"] == 2_000_000_000
+
+
+def test_size_change_reindexes(data_dir):
+    a = write(data_dir / "a.txt", "текст", mtime_ns=1_000_000_000)
+    indexed = {}
+    index([a], indexed, {a: ["old"]})
+    
+    # Тот же mtime, другой размер
+    write(data_dir / "a.txt", "текст длиннее", mtime_ns=1_000_000_000)
+    changed, deleted = index([a], indexed, {a: ["new"]})
+    
+    assert changed == [a]
+    assert deleted == ["old"]
+    assert indexed[os.path.abspath(a)]["size"] == len("текст длиннее".encode("utf-8"))
+
+
+def test_file_without_chunks_is_recorded_and_old_ids_deleted(data_dir):
+    a = write(data_dir / "a.txt", "текст", mtime_ns=1_000_000_000)
+    indexed = {}
+    index([a], indexed, {a: ["old1", "old2"]})
+    
+    write(data_dir / "a.txt", "", mtime_ns=2_000_000_000)
+    changed, deleted = index([a], indexed, {a: []})
+    
+    assert sorted(deleted) == ["old1", "old2"]
+    assert indexed[os.path.abspath(a)]["ids"] == []
+    assert find_changes([a], indexed)[1] == []
+
+
+def test_removed_files_are_pruned_only_in_data_dir(data_dir, tmp_path):
+    a = write(data_dir / "a.txt", "первый")
+    b = write(data_dir / "b.txt", "второй")
+    outside = write(tmp_path / "other.txt", "внешний")
+    indexed = {}
+    index([a, b, outside], indexed, {a: ["a1"], b: ["b1"], outside: ["o1"]})
+    
+    os.remove(b)
+    changed, deleted = index([a], indexed, {}, prune_dir=str(data_dir))
+    
+    assert changed == []
+    assert deleted == ["b1"]
+    assert set(indexed) == {os.path.abspath(a), os.path.abspath(outside)}
+    
+    # Без prune_dir (явный список --files) ничего не удаляется
+    assert find_changes([], indexed)[2] == []
+
+
+def test_missing_file_is_passed_to_processing(data_dir):
+    missing = str(data_dir / "missing.txt")
+    
+    stamps, changed, removed = find_changes([missing], {})
+    
+    assert changed == [missing]
+    assert stamps == {}
+
+
+def test_manifest_round_trip(tmp_path):
+    path = tmp_path / "manifest.json"
+    manifest = {"files": {"/data/a.txt": {"mtime_ns": 1, "size": 2, "ids": ["x"]}}}
+    
+    save_manifest(manifest, path)
+    
+    assert load_manifest(path) == manifest
+    assert not (tmp_path / "manifest.json.tmp").exists()
+
+
+def test_broken_manifest_is_ignored(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text("{не json", encoding="utf-8")
+    
+    assert load_manifest(path) == {"files": {}}
+    assert load_manifest(tmp_path / "absent.json") == {"files": {}}
@@ -0,0 +1,105 @@
+"""
+Тесты кеша ответов: точное совпадение и приблизительный поиск.
+"""
+
+from utils.response_cache import ResponseCache
+
+
+SYSTEM = {"role": "system", "content": "Ты ассистент"}
+
+# Эмбеддинги по словарю: близкие формулировки получают почти одинаковые векторы
+VECTORS = {
+    "как сбросить пароль?": [1.0, 0.0, 0.0],
+    "как сбросить пароль": [0.99, 0.05, 0.0],
+    "как удалить аккаунт?": [0.0, 1.0, 0.0],
+}
+
+
+def embed(text):
+    return VECTORS[text]
+
+
+def messages(query, history=()):
+    return [SYSTEM, *history, {"role": "user", "content": query}]
+
+
+def test_exact_hit_and_miss():
+    cache = ResponseCache()
+    cache.put(messages("Привет"), "GigaChat", 0, 100, "ответ")
+    
+    assert cache.get(messages("Привет"), "GigaChat", 0, 100) == "ответ"
+    assert cache.get(messages("Привет!"), "GigaChat", 0, 100) is None
+    assert cache.get(messages("Привет"), "GigaChat", 0, 200) is None
+    assert cache.get(messages("Привет"), "GigaChat-Pro", 0, 100) is None
+
+
+def test_exact_evicts_least_recently_used():
+    cache = ResponseCache(max_size=2)
+    cache.put(messages("a"), "GigaChat", 0, 100, "A")
+    cache.put(messages("b"), "GigaChat", 0, 100, "B")
+    # Обращение к "a" делает его свежим, вытесняется "b"
+    assert cache.get(messages("a"), "GigaChat", 0, 100) == "A"
+    cache.put(messages("c"), "GigaChat", 0, 100, "C")
+    
+    assert cache.get(messages("a"), "GigaChat", 0, 100) == "A"
+    assert cache.get(messages("b"), "GigaChat", 0, 100) is None
+    assert cache.get(messages("c"), "GigaChat", 0, 100) == "C"
+
+
+def test_approximate_hit_for_similar_query():
+    cache = ResponseCache(embed_fn=embed)
+    cache.put(messages("Как сбросить пароль?"), "GigaChat", 0, 100, "ответ")
+    
+    assert cache.get(messages("как сбросить  пароль"), "GigaChat", 0, 100) == "ответ"
+    assert cache.get(messages("Как удалить аккаунт?"), "GigaChat", 0, 100) is None
+
+
+def test_approximate_requires_same_params():
+    cache = ResponseCache(embed_fn=embed)
+    cache.put(messages("Как сбросить пароль?"), "GigaChat", 0, 100, "ответ")
+    
+    assert cache.get(messages("как сбросить пароль"), "GigaChat", 0, 200) is None
+
+
+def test_approximate_requires_same_context():
+    cache = ResponseCache(embed_fn=embed)
+    history = [
+        {"role": "user", "content": "Я забыл логин"},
+        {"role": "assistant", "content": "Логин указан в письме"},
+    ]
+    cache.put(messages("Как сбросить пароль?", history), "GigaChat", 0, 100, "ответ")
+    
+    # Тот же вопрос при другой истории или другом системном промпте - промах
+    assert cache.get(messages("как сбросить пароль"), "GigaChat", 0, 100) is None
+    other_system = [{"role": "system", "content": "Ты юрист"}, *history,
+                    {"role": "user", "content": "как сбросить пароль"}]
+    assert cache.get(other_system, "GigaChat", 0, 100) is None
+    
+    assert cache.get(messages("как сбросить пароль", history), "GigaChat", 0, 100) == "ответ"
+
+
+def test_approximate_after_eviction_and_growth():
+    # Ортогональные эмбеддинги: каждый запрос близок только к себе
+    def one_hot(text):
+        vector = [0.0] * 32
+        vector[int(text.split()[-1])] = 1.0
+        return vector
+    
+    cache = ResponseCache(max_size=20, embed_fn=one_hot)
+    for i in range(30):
+        cache.put(messages(f"вопрос {i}"), "GigaChat", 0, 100, f"ответ {i}")
+    
+    # Первые 10 вытеснены, их строки матрицы заняты оставшимися
+    for i in range(10):
+        assert cache.get(messages(f"Вопрос  {i}"), "GigaChat", 0, 100) is None
+    for i in range(10, 30):
+        assert cache.get(messages(f"Вопрос  {i}"), "GigaChat", 0, 100) == f"ответ {i}"
+    
+    cache.clear()
+    assert cache.get(messages("Вопрос  12"), "GigaChat", 0, 100) is None
+
+
+def test_accepts_only_deterministic_by_default():
+    assert ResponseCache().accepts(0)
+    assert not ResponseCache().accepts(0.7)
+    assert ResponseCache(only_deterministic=False).accepts(0.7)
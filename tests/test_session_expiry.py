@@ -0,0 +1,138 @@
+"""
+Тесты истечения сессий: колесо таймеров, ленивое удаление и фоновая очистка.
+"""
+
+import time
+
+import pytest
+
+from dialog_controller.session_manager import SessionManager
+
+
+WHEEL = SessionManager.WHEEL_SIZE
+
+
+class FakeClock:
+    """Управляемая замена time.monotonic()."""
+    
+    def __init__(self, start: float = 100_000.0):
+        self.now = start
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    # threading берет time.monotonic при импорте, ожидания потоков не затрагиваются
+    monkeypatch.setattr(time, "monotonic", fake)
+    return fake
+
+
+@pytest.fixture
+def make_manager(tmp_path, clock):
+    managers = []
+    
+    def make(**kwargs):
+        kwargs.setdefault("persist_dir", str(tmp_path / "sessions"))
+        kwargs.setdefault("sweep_interval", 3600)
+        kwargs.setdefault("save_delay", 0)
+        manager = SessionManager(**kwargs)
+        managers.append(manager)
+        return manager
+    
+    yield make
+    for manager in managers:
+        manager.close()
+
+
+def advance(clock, manager, seconds, step=None):
+    """Сдвигает часы, запуская очистку на каждом шаге."""
+    step = step or seconds
+    target = clock.now + seconds
+    while clock.now < target:
+        clock.now = min(clock.now + step, target)
+        manager.cleanup_expired_sessions()
+
+
+def test_expiry_after_several_wheel_turns(clock, make_manager):
+    timeout = 3 * WHEEL + 17
+    manager = make_manager(session_timeout=timeout)
+    manager.get_or_create_session("u1")
+    
+    # Слот сессии наступает на каждом обороте, но истекает она только на последнем
+    advance(clock, manager, timeout - 1, step=97)
+    assert "u1" in manager.sessions
+    assert manager.expired_count == 0
+    
+    advance(clock, manager, 3, step=1)
+    assert "u1" not in manager.sessions
+    assert manager.expired_count == 1
+    assert not manager._scheduled_expiry
+    assert not any(manager._wheel)
+
+
+def test_cleanup_jump_longer_than_wheel(clock, make_manager):
+    manager = make_manager(session_timeout=WHEEL // 2)
+    manager.get_or_create_session("u1")
+    manager.get_or_create_session("u2")
+    
+    clock.now += 5 * WHEEL
+    manager.cleanup_expired_sessions()
+    
+    assert not manager.sessions
+    assert manager.expired_count == 2
+
+
+def test_activity_postpones_expiry(clock, make_manager):
+    timeout = 2 * WHEEL + 5
+    manager = make_manager(session_timeout=timeout)
+    manager.get_or_create_session("active")
+    manager.get_or_create_session("idle")
+    
+    advance(clock, manager, timeout - 10, step=50)
+    manager.get_or_create_session("active")
+    
+    # Первоначальный срок прошел: неактивная сессия удалена, активная
+    # перепланирована на новый срок
+    advance(clock, manager, 20, step=1)
+    assert "idle" not in manager.sessions
+    assert "active" in manager.sessions
+    
+    advance(clock, manager, timeout, step=50)
+    assert "active" not in manager.sessions
+    assert manager.expired_count == 2
+
+
+def test_lazy_expiry_without_cleanup(clock, make_manager):
+    manager = make_manager(session_timeout=60)
+    first = manager.get_or_create_session("u1")
+    first.add_message("user", "привет")
+    
+    clock.now += 61
+    assert manager.get_session("u1") is None
+    assert "u1" not in manager.sessions
+    assert manager.expired_count == 1
+    
+    second = manager.get_or_create_session("u2")
+    clock.now += 61
+    assert manager.get_or_create_session("u2") is not second
+    assert manager.expired_count == 2
+    
+    # Очистка не считает повторно уже удаленные сессии
+    manager.cleanup_expired_sessions()
+    assert manager.expired_count == 2
+
+
+def test_background_sweeper_removes_expired(clock, make_manager):
+    manager = make_manager(session_timeout=60, sweep_interval=0.01)
+    manager.get_or_create_session("u1")
+    
+    clock.now += 61
+    deadline = time.perf_counter() + 5
+    while "u1" in manager.sessions and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    
+    assert "u1" not in manager.sessions
+    assert manager.expired_count == 1
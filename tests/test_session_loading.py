@@ -0,0 +1,91 @@
+"""
+Тесты загрузки сохраненных сессий.
+"""
+
+from datetime import datetime
+
+import orjson
+import pytest
+
+from dialog_controller.session_manager import SessionManager
+
+
+@pytest.fixture
+def persist_dir(tmp_path):
+    directory = tmp_path / "sessions"
+    directory.mkdir()
+    return directory
+
+
+@pytest.fixture
+def make_manager(persist_dir):
+    managers = []
+    
+    def make(**kwargs):
+        kwargs.setdefault("persist_dir", str(persist_dir))
+        kwargs.setdefault("save_delay", 0)
+        manager = SessionManager(**kwargs)
+        managers.append(manager)
+        return manager
+    
+    yield make
+    for manager in managers:
+        manager.close()
+
+
+def session_file(persist_dir, user_id, **overrides):
+    data = {
+        "roles": ["user", "assistant"],
+        "contents": ["привет", "здравствуйте"],
+        "timestamps": [1.0, 2.0],
+        "last_activity": datetime.now().isoformat(),
+    }
+    data.update(overrides)
+    (persist_dir / f"{user_id}.json").write_bytes(orjson.dumps(data))
+
+
+def test_broken_files_do_not_drop_other_sessions(persist_dir, make_manager):
+    session_file(persist_dir, "good1")
+    session_file(persist_dir, "no_activity", last_activity=None)
+    session_file(persist_dir, "bad_activity", last_activity="вчера")
+    (persist_dir / "not_json.json").write_bytes(b"{")
+    session_file(persist_dir, "good2")
+    
+    manager = make_manager()
+    
+    assert set(manager.sessions) == {"good1", "good2"}
+    history = manager.get_session("good1").get_conversation_history()
+    assert [message["content"] for message in history] == ["привет", "здравствуйте"]
+
+
+def legacy_session(last_activity, *contents):
+    return {
+        "conversation_history": [
+            {"role": "user", "content": content, "timestamp": last_activity.isoformat()}
+            for content in contents
+        ],
+        "last_activity": last_activity.isoformat(),
+    }
+
+
+def test_legacy_json_is_imported_once(tmp_path, persist_dir, make_manager):
+    legacy_path = tmp_path / "sessions.json"
+    legacy_path.write_bytes(orjson.dumps({
+        "u1": legacy_session(datetime.now(), "первый", "второй"),
+        "old": legacy_session(datetime(2020, 1, 1), "давний"),
+        "broken": {"conversation_history": [], "last_activity": None},
+    }))
+    
+    manager = make_manager(legacy_json_path=str(legacy_path))
+    
+    assert set(manager.sessions) == {"u1"}
+    history = manager.get_session("u1").get_conversation_history()
+    assert [message["content"] for message in history] == ["первый", "второй"]
+    
+    # Импортированная сессия записана в каталог, повторный импорт не нужен
+    manager.close()
+    assert (persist_dir / "u1.json").exists()
+    
+    legacy_path.write_bytes(orjson.dumps({"u2": legacy_session(datetime.now(), "новый")}))
+    reloaded = make_manager(legacy_json_path=str(legacy_path))
+    assert set(reloaded.sessions) == {"u1"}
@@ -5,76 +5,451 @@
 
 import sys
 import os
+import asyncio
+import gc
+import hashlib
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from operator import itemgetter
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import argparse
+import json
 import logging
 
 # Добавляем родительскую директорию в путь для импорта
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from config import Settings
-from storage import VectorDatabase, DocumentLoader
-from utils import setup_logging
+# Модули проекта тянут за собой chromadb, openai и tiktoken; они
+# импортируются там, где нужны, чтобы --help и ошибки аргументов
+# не ждали их загрузки
+if TYPE_CHECKING:
+    from storage import VectorDatabase, ChunkMeta
 
+logger = logging.getLogger(__name__)
 
-def process_documents(
+# Количество чанков в одной пачке, передаваемой в векторную БД
+BATCH_SIZE = 256
+
+# Расширения файлов, которые индексируются из data/
+SUPPORTED_EXTENSIONS = frozenset(('.txt', '.html', '.htm'))
+
+# Корень индексации: ID чанков строятся от путей файлов относительно него
+DATA_DIR = Path(__file__).parent.parent / 'data'
+
+# Манифест индексации: для каждого файла - mtime_ns, размер и ID его чанков
+MANIFEST_PATH = DATA_DIR / '.ingest_manifest.json'
+
+# Файл, все чанки которого добавлены: (путь, ID чанков)
+FileIds = Tuple[str, List[str]]
+
+Batch = Tuple[List[str], List["ChunkMeta"], List[str], List[FileIds]]
+
+
+def load_manifest(path: Path = MANIFEST_PATH) -> Dict:
+    """
+    Загружает манифест индексации.
+    
+    Args:
+        path: Путь к файлу манифеста
+        
+    Returns:
+        Манифест {"files": {путь: запись}}; пустой,
+        если файла нет или он поврежден
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get("files"), dict):
+            return manifest
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Манифест {path} не прочитан, индексируются все файлы: {e}")
+    return {"files": {}}
+
+
+def save_manifest(manifest: Dict, path: Path = MANIFEST_PATH):
+    """
+    Сохраняет манифест индексации атомарно (через временный файл).
+    
+    Args:
+        manifest: Манифест
+        path: Путь к файлу манифеста
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def find_changes(
     file_paths: List[str],
+    indexed: Dict[str, Dict],
+    prune_dir: Optional[str] = None
+) -> Tuple[Dict[str, Tuple[int, int]], List[str], List[str]]:
+    """
+    Сравнивает файлы с манифестом по mtime_ns и размеру.
+    
+    Args:
+        file_paths: Пути к файлам
+        indexed: Записи манифеста {абсолютный путь: запись}
+        prune_dir: Каталог, проиндексированные файлы которого, отсутствующие
+            в file_paths, считаются удаленными (опционально)
+        
+    Returns:
+        Кортеж ({путь: (mtime_ns, размер)} измененных файлов,
+        измененные файлы, пути удаленных файлов в манифесте)
+    """
+    stamps = {}
+    changed_paths = []
+    for file_path in file_paths:
+        key = os.path.abspath(file_path)
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            # Ошибку чтения сообщит обработка файла
+            changed_paths.append(file_path)
+            continue
+        
+        entry = indexed.get(key)
+        if entry is not None:
+            if (entry["mtime_ns"], entry["size"]) == (st.st_mtime_ns, st.st_size):
+                continue
+        stamps[key] = (st.st_mtime_ns, st.st_size)
+        changed_paths.append(file_path)
+    
+    removed_keys = []
+    if prune_dir is not None:
+        present = set(map(os.path.abspath, file_paths))
+        prune_root = os.path.abspath(prune_dir)
+        removed_keys = [
+            key for key in indexed
+            if key not in present and os.path.dirname(key) == prune_root
+        ]
+    
+    return stamps, changed_paths, removed_keys
+
+
+def record_indexed_files(
+    indexed: Dict[str, Dict],
+    stamps: Dict[str, Tuple[int, int]],
+    done_files: List[FileIds],
+    delete_documents: Callable[[List[str]], None]
+):
+    """
+    Записывает в манифест файлы, все чанки которых добавлены.
+    
+    Args:
+        indexed: Записи манифеста {абсолютный путь: запись}
+        stamps: mtime_ns и размер измененных файлов (из find_changes)
+        done_files: Добавленные файлы с ID их чанков
+        delete_documents: Удаляет чанки из векторной БД по ID
+    """
+    for file_path, ids in done_files:
+        key = os.path.abspath(file_path)
+        if key not in stamps:
+            continue
+        
+        # Неизмененные чанки файла сохранили свои ID и уже обновлены;
+        # удаляются только чанки прежней версии, которых больше нет
+        previous = indexed.get(key)
+        if previous is not None:
+            stale_ids = set(previous["ids"]).difference(ids)
+            if stale_ids:
+                delete_documents(list(stale_ids))
+        
+        mtime_ns, size = stamps[key]
+        indexed[key] = {"mtime_ns": mtime_ns, "size": size, "ids": ids}
+
+
+def _read_all(file_path: str) -> bytes:
+    """
+    Читает файл целиком одним системным вызовом.
+    
+    Args:
+        file_path: Путь к файлу
+        
+    Returns:
+        Содержимое файла
+    """
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        size = os.fstat(fd).st_size
+        chunks = []
+        # os.read может вернуть меньше запрошенного; обычно хватает одного вызова
+        while size > 0:
+            chunk = os.read(fd, size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+    finally:
+        os.close(fd)
+
+
+def _load_and_chunk(
+    file_path: str,
     chunk_size: int,
     chunk_overlap: int
-) -> tuple:
+) -> Tuple[int, List[Tuple[str, "ChunkMeta"]], List[str]]:
     """
-    Обрабатывает список документов.
+    Загружает документ и разбивает его на чанки (выполняется в процессе пула).
     
     Args:
-        file_paths: Список путей к файлам
+        file_path: Путь к файлу
         chunk_size: Размер чанка
         chunk_overlap: Перекрытие
         
     Returns:
-        Кортеж (тексты, метаданные, идентификаторы)
+        Кортеж (длина текста, чанки с метаданными, ID чанков)
+    """
+    from storage import DocumentLoader
+    
+    text, doc_type = DocumentLoader.load_from_bytes(
+        _read_all(file_path),
+        Path(file_path).suffix
+    )
+    
+    # ID чанка - хеш его текста и пути файла относительно корня индексации:
+    # неизмененный чанк при повторной индексации получает тот же ID
+    # независимо от порядка файлов, а одноименные файлы из разных папок
+    # не пересекаются. Повторы текста внутри файла дали бы одинаковые ID
+    # и отбрасываются до нумерации чанков
+    try:
+        id_source = Path(os.path.relpath(file_path, DATA_DIR)).as_posix()
+    except ValueError:
+        # Файл на другом диске (Windows)
+        id_source = Path(os.path.abspath(file_path)).as_posix()
+    
+    by_id = {}
+    for chunk in DocumentLoader.chunk_text(text, chunk_size, chunk_overlap):
+        # Файл без текста дает один пустой чанк: индексировать нечего
+        if not chunk.strip():
+            continue
+        chunk_id = hashlib.blake2b(
+            (chunk + "\0" + id_source).encode('utf-8'),
+            digest_size=16
+        ).hexdigest()
+        by_id.setdefault(chunk_id, chunk)
+    
+    chunks_with_meta = DocumentLoader.attach_metadata(
+        chunks=list(by_id.values()),
+        source=Path(file_path).name,
+        doc_type=doc_type
+    )
+    return len(text), chunks_with_meta, list(by_id)
+
+
+def process_documents(
+    file_paths: List[str],
+    chunk_size: int,
+    chunk_overlap: int,
+    batch_size: int = BATCH_SIZE,
+    workers: Optional[int] = None
+) -> Iterator[Batch]:
+    """
+    Обрабатывает список документов и отдает чанки пачками.
+    
+    Файлы загружаются и разбиваются на чанки параллельно в пуле процессов;
+    результаты обрабатываются в порядке входного списка. Пачка отдается,
+    как только наберется, поэтому в памяти не держатся чанки всего корпуса.
+    
+    Args:
+        file_paths: Список путей к файлам
+        chunk_size: Размер чанка
+        chunk_overlap: Перекрытие
+        batch_size: Максимальное количество чанков в пачке
+        workers: Количество процессов (по умолчанию - число ядер)
+        
+    Yields:
+        Кортежи (тексты, метаданные, идентификаторы, файлы, все чанки
+        которых вошли в эту или предыдущие пачки)
     """
+    from utils import flush_logs
+    
     all_chunks = []
     all_metadatas = []
     all_ids = []
     
-    doc_counter = 0
+    # Файлы, чанки которых еще в буфере: (путь, ID чанков, номер чанка
+    # после последнего чанка файла в общем потоке)
+    buffered_files = deque()
+    received = 0
+    emitted = 0
     
-    for file_path in file_paths:
-        try:
-            print(f"Обработка: {file_path}")
+    def completed_files() -> List[FileIds]:
+        done = []
+        while buffered_files and buffered_files[0][2] <= emitted:
+            file_path, file_ids, _ = buffered_files.popleft()
+            done.append((file_path, file_ids))
+        return done
+    
+    workers = workers or os.cpu_count() or 1
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # В работе не больше 2 * workers файлов: пул не простаивает, а готовые
+        # результаты не копятся в памяти, пока пачки отправляются в БД
+        paths = iter(file_paths)
+        pending = deque(
+            (file_path, executor.submit(_load_and_chunk, file_path, chunk_size, chunk_overlap))
+            for file_path in islice(paths, 2 * workers)
+        )
+        
+        while pending:
+            file_path, future = pending.popleft()
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append((
+                    next_path,
+                    executor.submit(_load_and_chunk, next_path, chunk_size, chunk_overlap)
+                ))
             
-            # Загружаем документ
-            text, doc_type = DocumentLoader.load_document(file_path)
-            print(f"  Загружено: {len(text)} символов")
+            try:
+                text_length, chunks_with_meta, file_ids = future.result()
+                
+                # Добавляем чанки файла в общий список целиком
+                all_chunks.extend(map(itemgetter(0), chunks_with_meta))
+                all_metadatas.extend(map(itemgetter(1), chunks_with_meta))
+                all_ids.extend(file_ids)
+                received += len(file_ids)
+                buffered_files.append((file_path, file_ids, received))
+                
+                while len(all_chunks) >= batch_size:
+                    emitted += batch_size
+                    yield (
+                        all_chunks[:batch_size],
+                        all_metadatas[:batch_size],
+                        all_ids[:batch_size],
+                        completed_files()
+                    )
+                    del all_chunks[:batch_size], all_metadatas[:batch_size], all_ids[:batch_size]
+                
+                logger.info(
+                    f"✓ {file_path}: {text_length} символов, "
+                    f"{len(chunks_with_meta)} чанков"
+                )
             
-            # Разбиваем на чанки
-            chunks_with_meta = DocumentLoader.create_chunks_with_metadata(
-                text=text,
-                chunk_size=chunk_size,
-                overlap=chunk_overlap,
-                source=Path(file_path).name,
-                doc_type=doc_type
-            )
+            except Exception as e:
+                logger.error(f"✗ {file_path}: {e}")
             
-            print(f"  Создано чанков: {len(chunks_with_meta)}")
+            # Накопленные записи выводятся одним системным вызовом на файл
+            flush_logs()
+    
+    if all_chunks or buffered_files:
+        emitted = received
+        yield all_chunks, all_metadatas, all_ids, completed_files()
+
+
+async def add_batches(
+    vector_db: "VectorDatabase",
+    batches: Iterable[Batch],
+    prefetch: int = 2,
+    on_files_added: Optional[Callable[[List[FileIds]], None]] = None,
+    concurrency: int = 4
+) -> int:
+    """
+    Добавляет пачки чанков в векторную БД по мере их готовности.
+    
+    Пачки готовит отдельный поток, поэтому загрузка и разбиение следующих
+    файлов идут, пока пачки отправляются в API и векторную БД. Одновременно
+    отправляется до concurrency пачек: время ответа API на одну пачку
+    не задерживает следующие.
+    
+    Args:
+        vector_db: Векторная БД
+        batches: Пачки (тексты, метаданные, идентификаторы)
+        prefetch: Сколько готовых пачек может ждать отправки
+        on_files_added: Вызывается с файлами, все чанки которых добавлены
+        concurrency: Максимум одновременно отправляемых пачек
+        
+    Returns:
+        Количество добавленных чанков
+    """
+    ready: "queue.Queue" = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    
+    def put(item) -> bool:
+        # Ожидание места в очереди прерывается, если отправка остановилась
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def produce():
+        try:
+            for batch in batches:
+                if not put(batch):
+                    return
+            put(None)
+        except Exception as e:
+            put(e)
+        finally:
+            close = getattr(batches, "close", None)
+            if close is not None:
+                close()
+    
+    producer = threading.Thread(target=produce, name="ingest-producer", daemon=True)
+    producer.start()
+    
+    # Отправляемые пачки в порядке поступления: (задача, файлы). Файлы
+    # отмечаются добавленными, только когда записаны все пачки до них
+    in_flight = deque()
+    total = 0
+    
+    async def finish_oldest():
+        nonlocal total
+        task, done_files = in_flight.popleft()
+        if task is not None:
+            total += await task
+            logger.info(f"Добавлено чанков: {total}")
+        if done_files and on_files_added is not None:
+            on_files_added(done_files)
+    
+    async def store(texts: List[str], metadatas: List["ChunkMeta"], ids: List[str]) -> int:
+        await vector_db.add_documents_async(
+            texts=texts,
+            metadatas=metadatas,
+            ids=ids
+        )
+        return len(texts)
+    
+    try:
+        while True:
+            item = await asyncio.to_thread(ready.get)
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
             
-            # Добавляем в общий список
-            for chunk_data in chunks_with_meta:
-                all_chunks.append(chunk_data['text'])
-                all_metadatas.append(chunk_data['metadata'])
-                
-                chunk_id = f"doc_{doc_counter}_chunk_{chunk_data['metadata']['chunk_id']}"
-                all_ids.append(chunk_id)
+            texts, metadatas, ids, done_files = item
+            task = asyncio.create_task(store(texts, metadatas, ids)) if texts else None
+            in_flight.append((task, done_files))
             
-            doc_counter += 1
-            print(f"  ✓ Успешно обработан\n")
+            while len(in_flight) >= concurrency or (in_flight and in_flight[0][0] is None):
+                await finish_oldest()
         
-        except Exception as e:
-            print(f"  ✗ Ошибка: {e}\n")
-            continue
+        while in_flight:
+            await finish_oldest()
+    finally:
+        stop.set()
+        pending = [task for task, _ in in_flight if task is not None]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await asyncio.to_thread(producer.join)
     
-    return all_chunks, all_metadatas, all_ids
+    return total
 
 
 def main():
@@ -99,108 +474,183 @@ def main():
         default=100,
         help='Перекрытие (по умолчанию: 100)'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Количество процессов обработки файлов (по умолчанию: число ядер)'
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=4,
+        help='Количество пачек, одновременно отправляемых в БД (по умолчанию: 4)'
+    )
     
     args = parser.parse_args()
     
+    from config import Settings
+    from storage import VectorDatabase
+    from utils import setup_logging, EmbeddingCache
+    
     # Настройка логирования
-    setup_logging(level="INFO")
-    logger = logging.getLogger(__name__)
+    # Буферизованный вывод: записи о файлах не сбрасывают stdout по одной
+    setup_logging(level="INFO", buffered=True)
     
-    print("=" * 60)
-    print("ЗАГРУЗКА ДОКУМЕНТОВ В ВЕКТОРНУЮ БД")
-    print("=" * 60)
+    logger.info("ЗАГРУЗКА ДОКУМЕНТОВ В ВЕКТОРНУЮ БД")
     
     # Определяем файлы для обработки
+    data_dir = DATA_DIR
     if args.files:
         file_paths = args.files
     else:
         # Берем все файлы из agent/data/
-        data_dir = Path(__file__).parent.parent / 'data'
         if not data_dir.exists():
-            print(f"✗ Директория {data_dir} не найдена!")
-            print(f"Создайте папку agent/data/ и поместите туда документы")
+            logger.error(
+                f"✗ Директория {data_dir} не найдена! "
+                f"Создайте папку agent/data/ и поместите туда документы"
+            )
             sys.exit(1)
         
-        file_paths = [
-            str(f) for f in data_dir.iterdir()
-            if f.suffix.lower() in ['.txt', '.html', '.htm']
-        ]
+        with os.scandir(data_dir) as entries:
+            file_paths = [
+                entry.path for entry in entries
+                if entry.is_file(follow_symlinks=False)
+                and os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS
+            ]
     
     if not file_paths:
-        print("✗ Не найдено файлов для обработки!")
+        logger.error("✗ Не найдено файлов для обработки!")
         sys.exit(1)
     
-    print(f"Файлов для обработки: {len(file_paths)}")
-    print(f"Размер чанка: {args.chunk_size}")
-    print(f"Перекрытие: {args.overlap}")
-    print("=" * 60)
-    print()
-    
-    # Обрабатываем документы
-    texts, metadatas, ids = process_documents(
-        file_paths=file_paths,
-        chunk_size=args.chunk_size,
-        chunk_overlap=args.overlap
+    logger.info(
+        f"Файлов для обработки: {len(file_paths)}, "
+        f"размер чанка: {args.chunk_size}, перекрытие: {args.overlap}"
     )
     
-    if not texts:
-        print("✗ Не удалось обработать ни одного документа!")
-        sys.exit(1)
-    
-    print(f"Всего чанков: {len(texts)}\n")
-    
     # Загружаем настройки
     try:
         settings = Settings.from_env()
     except ValueError as e:
-        print(f"✗ Ошибка настроек: {e}")
-        print("\nУстановите OPENAI_API_KEY в переменных окружения или .env файле")
+        logger.error(
+            f"✗ Ошибка настроек: {e}. "
+            f"Установите OPENAI_API_KEY в переменных окружения или .env файле"
+        )
         sys.exit(1)
     
     # Инициализируем векторную БД
-    print("=" * 60)
-    print("ИНИЦИАЛИЗАЦИЯ ВЕКТОРНОЙ БД")
-    print("=" * 60)
+    logger.info("ИНИЦИАЛИЗАЦИЯ ВЕКТОРНОЙ БД")
+    
+    # Неизмененные чанки при повторной индексации не отправляются в API
+    embedding_cache = EmbeddingCache(settings.embedding_cache_path)
     
     vector_db = VectorDatabase(
         persist_directory=settings.chroma_persist_dir,
         collection_name=settings.chroma_collection,
-        openai_api_key=settings.openai_api_key
+        openai_api_key=settings.openai_api_key,
+        embedding_model=settings.openai_embedding_model,
+        embedding_dimensions=settings.openai_embedding_dimensions,
+        embedding_cache=embedding_cache
     )
     
     vector_db.get_or_create_collection()
     
-    # Добавляем документы
-    print("\n" + "=" * 60)
-    print("ДОБАВЛЕНИЕ ДОКУМЕНТОВ")
-    print("=" * 60)
-    
+    manifest = None
     try:
-        vector_db.add_documents(
-            texts=texts,
-            metadatas=metadatas,
-            ids=ids
+        # Файлы с теми же mtime и размером, что при прошлой индексации,
+        # пропускаются без чтения. Манифест пустой коллекции не действует
+        manifest = load_manifest()
+        if not vector_db.get_stats().get("document_count"):
+            manifest = {"files": {}}
+        indexed = manifest["files"]
+        
+        stamps, changed_paths, removed_keys = find_changes(
+            file_paths,
+            indexed,
+            # Чанки файлов, удаленных из data/, удаляются из коллекции
+            prune_dir=None if args.files else str(data_dir)
+        )
+        
+        if removed_keys:
+            vector_db.delete_documents([
+                chunk_id for key in removed_keys for chunk_id in indexed[key]["ids"]
+            ])
+            for key in removed_keys:
+                del indexed[key]
+        
+        logger.info(
+            f"Без изменений: {len(file_paths) - len(changed_paths)}, "
+            f"к индексации: {len(changed_paths)}"
         )
+        if not changed_paths:
+            logger.info("✓ Все документы актуальны, индексация не требуется")
+            return
+        
+        processed_files = 0
         
-        print("\n✓ Все документы успешно добавлены!")
+        def record_files(done_files: List[FileIds]):
+            nonlocal processed_files
+            processed_files += len(done_files)
+            record_indexed_files(indexed, stamps, done_files, vector_db.delete_documents)
+        
+        # Обрабатываем и добавляем документы: пачки уходят в векторную БД
+        # по мере обработки файлов
+        logger.info("ОБРАБОТКА И ДОБАВЛЕНИЕ ДОКУМЕНТОВ")
+        
+        batches = process_documents(
+            file_paths=changed_paths,
+            chunk_size=args.chunk_size,
+            chunk_overlap=args.overlap,
+            workers=args.workers
+        )
+        # На время индексации циклический сборщик мусора отключается: он
+        # запускался бы на каждые несколько сотен полученных метаданных и
+        # кортежей чанков, а циклов здесь почти не создается - память
+        # освобождается подсчетом ссылок
+        gc.disable()
+        try:
+            total_chunks = asyncio.run(
+                add_batches(
+                    vector_db,
+                    batches,
+                    on_files_added=record_files,
+                    concurrency=args.concurrency
+                )
+            )
+        finally:
+            gc.enable()
+            gc.collect()
+        
+        if not processed_files:
+            logger.error("✗ Не удалось обработать ни одного документа!")
+            sys.exit(1)
+        
+        # Файлы без текста тоже обработаны: они записаны в манифест,
+        # а чанки их прежних версий удалены
+        logger.info(
+            f"✓ Обработано файлов: {processed_files} из {len(changed_paths)}, "
+            f"добавлено чанков: {total_chunks}"
+        )
         
         # Выводим статистику
         stats = vector_db.get_stats()
-        print("\n" + "=" * 60)
-        print("СТАТИСТИКА")
-        print("=" * 60)
-        print(f"Коллекция: {stats['name']}")
-        print(f"Документов: {stats['document_count']}")
-        print("=" * 60)
+        logger.info(
+            f"СТАТИСТИКА: коллекция {stats['name']}, "
+            f"документов {stats['document_count']}"
+        )
         
-        print("\n✅ ЗАГРУЗКА ЗАВЕРШЕНА!")
-        print("\nТеперь можно запустить бота:")
-        print("  python main.py")
+        logger.info("✅ ЗАГРУЗКА ЗАВЕРШЕНА! Теперь можно запустить бота: python main.py")
     
     except Exception as e:
-        logger.error(f"Ошибка добавления документов: {e}", exc_info=True)
-        print(f"\n✗ Ошибка: {e}")
+        logger.error(f"✗ Ошибка добавления документов: {e}", exc_info=True)
         sys.exit(1)
+    
+    finally:
+        # Файлы, добавленные до ошибки, при следующем запуске пропускаются
+        if manifest is not None:
+            save_manifest(manifest)
+        # Закрытие переносит журнал WAL в основной файл кеша
+        embedding_cache.close()
 
 
 if __name__ == "__main__":
@@ -1,6 +1,8 @@
 """Утилиты."""
 
-from .logging_config import setup_logging
+from .logging_config import setup_logging, flush_logs
+from .response_cache import ResponseCache
+from .embedding_cache import EmbeddingCache
 
-__all__ = ["setup_logging"]
+__all__ = ["setup_logging", "flush_logs", "ResponseCache", "EmbeddingCache"]
 
@@ -0,0 +1,134 @@
+"""
+Постоянный кеш эмбеддингов.
+Позволяет при повторной индексации не запрашивать эмбеддинги
+неизмененных чанков.
+"""
+
+from typing import List, Optional, Sequence
+import hashlib
+import logging
+import sqlite3
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Ограничение числа параметров в одном SQL-запросе (старые сборки SQLite
+# допускают не больше 999)
+_SELECT_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    Кеш эмбеддингов в SQLite.
+    
+    Ключ - хеш модели эмбеддингов и текста, значение - вектор в float16:
+    вдвое меньше места на диске, а для поиска точности хватает.
+    """
+    
+    def __init__(self, path: str = "./embedding_cache.db"):
+        """
+        Инициализирует кеш эмбеддингов.
+        
+        Args:
+            path: Путь к файлу SQLite
+        """
+        self.path = path
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        
+        logger.info(f"EmbeddingCache инициализирован: {path}")
+    
+    @staticmethod
+    def make_key(text: str, model: str) -> bytes:
+        """
+        Строит ключ кеша.
+        
+        Args:
+            text: Текст
+            model: Модель эмбеддингов (вместе с размерностью, если она задана)
+            
+        Returns:
+            Ключ кеша
+        """
+        return hashlib.blake2b(
+            model.encode('utf-8') + b"\0" + text.encode('utf-8'),
+            digest_size=16
+        ).digest()
+    
+    def get_many(self, texts: Sequence[str], model: str) -> List[Optional[List[float]]]:
+        """
+        Получает эмбеддинги текстов из кеша.
+        
+        Args:
+            texts: Тексты
+            model: Модель эмбеддингов
+            
+        Returns:
+            Эмбеддинги в порядке текстов; None для отсутствующих в кеше
+        """
+        keys = [self.make_key(text, model) for text in texts]
+        found = {}
+        
+        with self._lock:
+            for i in range(0, len(keys), _SELECT_BATCH):
+                batch = keys[i:i + _SELECT_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ))
+        
+        return [
+            np.frombuffer(found[key], dtype=np.float16).astype(np.float32).tolist()
+            if key in found else None
+            for key in keys
+        ]
+    
+    def put_many(
+        self,
+        texts: Sequence[str],
+        model: str,
+        embeddings: Sequence[Sequence[float]]
+    ):
+        """
+        Сохраняет эмбеддинги текстов одной транзакцией.
+        
+        Args:
+            texts: Тексты
+            model: Модель эмбеддингов
+            embeddings: Эмбеддинги в порядке текстов
+        """
+        rows = [
+            (self.make_key(text, model), np.asarray(embedding, dtype=np.float16).tobytes())
+            for text, embedding in zip(texts, embeddings)
+        ]
+        
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                        rows
+                    )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        except Exception as e:
+            logger.error(f"Ошибка сохранения кеша эмбеддингов: {e}")
+    
+    def close(self):
+        """Закрывает соединение с базой."""
+        with self._lock:
+            self._conn.close()
@@ -2,37 +2,105 @@
 Конфигурация логирования.
 """
 
+import io
 import logging
 import sys
 
+# Размер буфера вывода логов в буферизованном режиме
+_BUFFER_SIZE = 65536
 
-def setup_logging(level: str = "INFO"):
+# Внешние библиотеки с избыточным логированием
+_NOISY_LOGGERS = ("httpx", "httpcore", "telegram", "chromadb")
+
+# Логирование уже настроено: повторный вызов меняет только уровень
+_configured = False
+
+
+class _BufferedStreamHandler(logging.StreamHandler):
+    """
+    Обработчик логов, который не сбрасывает поток после каждой записи.
+    
+    Записи копятся в буфере и выводятся одним системным вызовом при
+    заполнении буфера, вызове flush_logs() или завершении программы.
+    Предупреждения и ошибки выводятся сразу.
+    """
+    
+    def emit(self, record: logging.LogRecord):
+        """Записывает запись в буфер."""
+        super().emit(record)
+        if record.levelno >= logging.WARNING:
+            self.flush_buffer()
+    
+    def flush(self):
+        """Не сбрасывает буфер: это делает flush_buffer()."""
+        # StreamHandler.emit сбрасывает поток после каждой записи
+        pass
+    
+    def flush_buffer(self):
+        """Выводит накопленные записи."""
+        with self.lock:
+            self.stream.flush()
+    
+    def close(self):
+        """Выводит накопленные записи и закрывает обработчик."""
+        self.flush_buffer()
+        super().close()
+
+
+def setup_logging(level: str = "INFO", buffered: bool = False):
     """
     Настраивает систему логирования.
     
     Args:
         level: Уровень логирования (DEBUG, INFO, WARNING, ERROR)
+        buffered: Выводить логи через буфер (для пакетных скриптов
+            с большим числом записей); буфер сбрасывает flush_logs()
     """
+    global _configured
+    
     # Получаем уровень
     numeric_level = getattr(logging, level.upper(), logging.INFO)
     
+    if _configured:
+        logging.getLogger().setLevel(numeric_level)
+        return
+    
     # Формат логов
     log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     
-    # Настраиваем root logger
-    logging.basicConfig(
-        level=numeric_level,
-        format=log_format,
-        handlers=[
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+    # Настраиваем root logger; force=True заменяет обработчики, добавленные
+    # до вызова (иначе basicConfig ничего не делает и уровень не меняется)
+    if buffered:
+        sys.stdout.flush()
+        stream = io.TextIOWrapper(
+            open(sys.stdout.fileno(), 'wb', buffering=_BUFFER_SIZE, closefd=False),
+            encoding=sys.stdout.encoding or 'utf-8',
+            write_through=False
+        )
+        logging.basicConfig(
+            level=numeric_level,
+            format=log_format,
+            handlers=[_BufferedStreamHandler(stream)],
+            force=True
+        )
+    else:
+        logging.basicConfig(
+            level=numeric_level,
+            format=log_format,
+            stream=sys.stdout,
+            force=True
+        )
     
     # Отключаем избыточное логирование от внешних библиотек
-    logging.getLogger("httpx").setLevel(logging.WARNING)
-    logging.getLogger("httpcore").setLevel(logging.WARNING)
-    logging.getLogger("telegram").setLevel(logging.WARNING)
-    logging.getLogger("chromadb").setLevel(logging.WARNING)
+    for name in _NOISY_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
     
+    _configured = True
     logging.info(f"Логирование настроено: уровень={level}")
 
+
+def flush_logs():
+    """Выводит записи, накопленные буферизованными обработчиками."""
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, _BufferedStreamHandler):
+            handler.flush_buffer()
@@ -0,0 +1,255 @@
+"""
+Кеш ответов языковой модели.
+Позволяет не обращаться к LLM для повторяющихся и близких запросов.
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import hashlib
+import logging
+import threading
+
+import numpy as np
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Кеш ответов LLM: сначала точное совпадение, затем поиск похожего запроса.
+    
+    Точный ключ - хеш всего списка сообщений и параметров генерации.
+    Приблизительный поиск включается, если передана функция эмбеддингов:
+    сравнивается последнее сообщение пользователя по косинусной близости,
+    а все предыдущие сообщения (системный промпт, история) должны совпадать
+    точно - их хеш входит в параметры записи. Эмбеддинги записей с одними
+    параметрами лежат в строках одной матрицы, поэтому сравнение с ними -
+    одно матричное умножение.
+    """
+    
+    def __init__(
+        self,
+        max_size: int = 1024,
+        embed_fn: Optional[Callable[[str], List[float]]] = None,
+        similarity_threshold: float = 0.95,
+        only_deterministic: bool = True
+    ):
+        """
+        Инициализирует кеш ответов.
+        
+        Args:
+            max_size: Максимальное количество ответов в кеше
+            embed_fn: Функция эмбеддинга текста (включает приблизительный поиск)
+            similarity_threshold: Минимальная косинусная близость для попадания
+            only_deterministic: Кешировать только запросы с temperature=0
+        """
+        self.max_size = max_size
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.only_deterministic = only_deterministic
+        
+        self._exact: "OrderedDict[str, str]" = OrderedDict()
+        # Ключ -> (параметры генерации и хеш контекста, строка матрицы, ответ)
+        self._approximate: Dict[str, Tuple[Tuple, int, str]] = {}
+        # Параметры -> [матрица нормированных эмбеддингов, ключи ее строк]
+        self._groups: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+        # Последний вычисленный эмбеддинг: put() после промаха в get()
+        # не запрашивает эмбеддинг того же текста повторно
+        self._last_embedding: Tuple[str, Optional[np.ndarray]] = ("", None)
+        
+        logger.info(
+            f"ResponseCache инициализирован: max_size={max_size}, "
+            f"approximate={'да' if embed_fn else 'нет'}"
+        )
+    
+    def accepts(self, temperature: float) -> bool:
+        """
+        Проверяет, можно ли кешировать ответ при данной температуре.
+        
+        Args:
+            temperature: Температура генерации
+        
+        Returns:
+            True если ответ можно кешировать
+        """
+        return not self.only_deterministic or temperature == 0
+    
+    def get(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: int
+    ) -> Optional[str]:
+        """
+        Ищет ответ в кеше.
+        
+        Args:
+            messages: Список сообщений
+            model: Модель
+            temperature: Температура
+            max_tokens: Макс токены
+        
+        Returns:
+            Закешированный ответ или None
+        """
+        params = (model, temperature, max_tokens)
+        key = self._make_key(messages, params)
+        
+        with self._lock:
+            answer = self._exact.get(key)
+            if answer is not None:
+                self._exact.move_to_end(key)
+                logger.info("Ответ найден в кеше (точное совпадение)")
+                return answer
+        
+        if not self.embed_fn:
+            return None
+        
+        vector = self._embed(self._query_text(messages))
+        if vector is None:
+            return None
+        
+        params = self._approximate_params(messages, params)
+        with self._lock:
+            group = self._groups.get(params)
+            if group is None or group[0].shape[1] != vector.shape[0]:
+                return None
+            
+            matrix, keys = group
+            similarities = matrix[:len(keys)] @ vector
+            row = int(np.argmax(similarities))
+            similarity = float(similarities[row])
+            if similarity < self.similarity_threshold:
+                return None
+            answer = self._approximate[keys[row]][2]
+        
+        logger.info(f"Ответ найден в кеше (близость {similarity:.3f})")
+        return answer
+    
+    def put(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        answer: str
+    ):
+        """
+        Сохраняет ответ в кеш.
+        
+        Args:
+            messages: Список сообщений
+            model: Модель
+            temperature: Температура
+            max_tokens: Макс токены
+            answer: Ответ модели
+        """
+        params = (model, temperature, max_tokens)
+        key = self._make_key(messages, params)
+        
+        vector = self._embed(self._query_text(messages)) if self.embed_fn else None
+        if vector is not None:
+            params = self._approximate_params(messages, params)
+        
+        with self._lock:
+            self._exact[key] = answer
+            self._exact.move_to_end(key)
+            if key in self._approximate:
+                self._approximate_remove(key)
+            if vector is not None:
+                self._approximate_add(key, vector, params, answer)
+            
+            while len(self._exact) > self.max_size:
+                old_key, _ = self._exact.popitem(last=False)
+                if old_key in self._approximate:
+                    self._approximate_remove(old_key)
+    
+    def clear(self):
+        """Очищает кеш."""
+        with self._lock:
+            self._exact.clear()
+            self._approximate.clear()
+            self._groups.clear()
+    
+    def _approximate_add(self, key: str, vector: np.ndarray, params: Tuple, answer: str):
+        """Добавляет эмбеддинг в матрицу группы параметров (под self._lock)."""
+        group = self._groups.get(params)
+        if group is None or group[0].shape[1] != vector.shape[0]:
+            if group is not None:
+                # Сменилась размерность эмбеддингов: старые записи группы несравнимы
+                for old_key in group[1]:
+                    del self._approximate[old_key]
+            group = [np.empty((8, vector.shape[0]), dtype=np.float32), []]
+            self._groups[params] = group
+        
+        matrix, keys = group
+        row = len(keys)
+        if row == matrix.shape[0]:
+            matrix = np.concatenate([matrix, np.empty_like(matrix)])
+            group[0] = matrix
+        matrix[row] = vector
+        keys.append(key)
+        self._approximate[key] = (params, row, answer)
+    
+    def _approximate_remove(self, key: str):
+        """Удаляет эмбеддинг из матрицы, перенося на его место последнюю строку (под self._lock)."""
+        params, row, _ = self._approximate.pop(key)
+        matrix, keys = self._groups[params]
+        last = len(keys) - 1
+        if row != last:
+            moved_key = keys[last]
+            matrix[row] = matrix[last]
+            keys[row] = moved_key
+            moved_params, _, moved_answer = self._approximate[moved_key]
+            self._approximate[moved_key] = (moved_params, row, moved_answer)
+        keys.pop()
+        if not keys:
+            del self._groups[params]
+    
+    @staticmethod
+    def _make_key(messages: List[Dict[str, str]], params: Tuple) -> str:
+        """Строит ключ точного совпадения."""
+        raw = orjson.dumps([messages, params])
+        return hashlib.blake2b(raw, digest_size=16).hexdigest()
+    
+    @staticmethod
+    def _approximate_params(messages: List[Dict[str, str]], params: Tuple) -> Tuple:
+        """Дополняет параметры хешем всех сообщений, кроме последнего."""
+        context = hashlib.blake2b(orjson.dumps(messages[:-1]), digest_size=16).hexdigest()
+        return params + (context,)
+    
+    @staticmethod
+    def _query_text(messages: List[Dict[str, str]]) -> str:
+        """Возвращает последнее сообщение пользователя, нормализованное."""
+        for message in reversed(messages):
+            if message.get("role") == "user":
+                return " ".join(message.get("content", "").lower().split())
+        return ""
+    
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        """Вычисляет нормированный эмбеддинг текста."""
+        if not text:
+            return None
+        
+        with self._lock:
+            last_text, last_vector = self._last_embedding
+        if text == last_text:
+            return last_vector
+        
+        try:
+            vector = np.asarray(self.embed_fn(text), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Не удалось получить эмбеддинг для кеша: {e}")
+            return None
+        
+        norm = float(np.linalg.norm(vector))
+        if not norm:
+            return None
+        
+        vector = vector / norm
+        with self._lock:
+            self._last_embedding = (text, vector)
+        return vector